@@ -24,135 +24,46 @@
 
 
 from argparse import ArgumentParser
-from ast import literal_eval
-from bs4 import BeautifulSoup
+from alsangue.assets import Assets, modes
+from alsangue.compress import Precompressor, compressed, text_files
+from alsangue.feeds import files as feed_files, writers as feed_writers
+from alsangue.fragments import FragmentCache
+from alsangue.graph import DependencyGraph
+from alsangue.index import ContentIndex, describe, taxonomies
+from alsangue.links import LinkChecker
+from alsangue.loaders import set_cache
+from alsangue.manifest import Journal, Manifest
+from alsangue.minify import minify_html
+from alsangue.pipeline import MemoryGuard, Writer, prefetch
+from alsangue.profile import Profiler, count, set_profiler, stage
+from alsangue.search import SearchIndex, terms
+from alsangue.session import BuildResult, Session
+from alsangue.sitemap import Sitemap, part_name
+from alsangue.stamp import Stamp
+from alsangue.template import element, fragment
+from alsangue.utils import hidden, ls, date_print, date_from_epoch, dict_from_file, load, save, link
+from alsangue.watch import Watcher, serve
+from collections import deque
+from contextlib import nullcontext
 from copy import copy
-from os import listdir, mkdir, getcwd
-from os import chdir as cd
-from os import symlink as ln
+from functools import partial
+from io import BytesIO
+from json import dumps
+from itertools import islice
+from os import makedirs, mkdir, getcwd, rmdir, walk
 from os import remove as rm
-from os.path import join, realpath, dirname, relpath, getmtime
-from re import sub
-from setproctitle import setproctitle
-from shutil import copyfile as cp
-from time import strftime, strptime, localtime
-import locale
+from os.path import join, realpath, dirname, relpath, exists, isdir, islink
+from html import escape
+from re import compile as regex, sub
+from shutil import rmtree
+from time import localtime, monotonic, strftime
+from traceback import print_exc
+import sys
 
 name = "alsangue"
 version = "0.2.1"
-setproctitle(name)
 
-hidden = lambda f : f.startswith('.')
-
-def ls(dir):
-    """Returns non hidden files in a dir
-
-    Args:
-        dir (str): path of the dir to be read
-    """
-    files = listdir(dir)
-    return [f for f in files if not hidden(f)]
-
-def date_print(date):
-    """Converts ISO 8601 calendar date (YYYY-MM-DD) in a fancy format
-    
-    Args:
-        date (str): YYYY-MM-DD
-    Returns:
-        The date converted (i.e. 26 August 2018)
-    """
-    date = strptime(date, "%Y/%m/%d")
-    return strftime('%d %B %Y', date)
-
-def getlastedit(f,sitemap=False):
-    """Return the date of the last edit of a file
-    
-    Args:
-        f (str): path of the file
-    Returns:
-        The date in the fancy format (i.e. 26 August 2018)
-    """
-    epoch = getmtime(f)
-    date = localtime(epoch)
-    if sitemap:
-        return strftime('%Y-%m-%d', date)
-    return strftime('%d %B %Y', date)
-
-def dict_from_file(f):
-    """Load a Python dictionary read from a file into a variable
-
-    Args:
-        f (str): path of the file containing the dictionary
-    Returns:
-        content (dict): the dictionary read from the file
-    """
-    with open(f, 'r') as g:
-        content = literal_eval(g.read())
-        g.close()
-    return content
-
-def load(f):
-    """Load a text file into a variable
-    
-    Args:
-        f (str): path of the text file
-    Returns:
-        content (str): the variable containing the text
-    """
-    with open(f) as g:
-        content = g.read()
-        g.close()
-    return content
-
-def save(soup, file):
-    """Save a soup object in file
-
-    Args:
-        soup: instance of BeautifulSoup object
-        file (str): path of the file
-    """
-    if not type(soup) == str:
-        mode = 'wb'
-    else:
-        mode = 'w'
-    with open(file, mode) as f:
-        f.write(soup)
-        f.close()
-
-class Sitemap:
-    def __init__(self, path):
-        code = """<?xml version="1.0" encoding="UTF-8"?><urlset xmlns:xhtml="http://www.w3.org/1999/xhtml" xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"></urlset> """
-        self.path = path
-        self.soup = BeautifulSoup(code, 'xml')
-        self.urlset = self.soup.find('urlset')
-
-    def add_url(self, loc, lastmod=None, locales={}, changefreq='monthly', priority='0.5'):
-        soup = BeautifulSoup('', 'lxml')
-        url = soup.new_tag('url')
-        self.urlset.append(url)
-
-        loc_tag = soup.new_tag('loc')
-        loc_tag.append(loc)
-        url.append(loc_tag)
-
-        if lastmod != None:
-            lastmod_tag = soup.new_tag('lastmod')
-            lastmod_tag.append(lastmod)
-            url.append(lastmod_tag)
-
-        for code in locales.keys():
-            url.append(BeautifulSoup("", 'xml').new_tag('xhtml:link', attrs={'rel':'alternate', 'hreflang':code, 'href':locales[code]}))
-
-        changefreq_tag = soup.new_tag('changefreq')
-        changefreq_tag.append(changefreq)
-        url.append(changefreq_tag)
-
-        priority_tag = soup.new_tag('priority')
-        priority_tag.append(priority)
-        url.append(priority_tag)
-
-    def save(self):
-        save(self.soup.prettify(encoding='utf-8'), join(self.path, "sitemap.xml"))
+url_marker = regex("\x00([^\x00]*)\x00")
 
 class Builder:
     """Builds the website
@@ -162,53 +73,614 @@ class Builder:
     Different language builds of the website will be builded if the writer has written
     articles or sections in his author file in a language present in the "locales" directory.
 
+    In incremental mode the inputs behind every page are recorded in a manifest
+    in the build directory and only the pages whose inputs changed are rendered again. A
+    successful incremental build stamps the build directory (alsangue.stamp),
+    so that the command line can tell that nothing changed without building.
+
+    Pages are planned, in a fixed order, as render tasks which are streamed to
+    the renderer as soon as they are planned: they are executed either serially
+    or by a pool of worker processes, which receive a few tasks at a time. The
+    sitemap is filled during planning, so that it does not depend on the number
+    of jobs.
+
+    Besides the dependency graph, only small records of the articles and the
+    authors (alsangue.index) are kept for the whole build; documents and pages
+    are dropped as soon as they have been indexed or written. With a memory
+    limit, the queues of files being read and written are bounded accordingly
+    and the resident memory of every process is checked while rendering, see
+    alsangue.pipeline.MemoryGuard.
+
+    Content files are read through alsangue.loaders; parsed files are cached in
+    the build directory, so that unchanged files are not parsed again.
+
+    With threads, input and output overlap with rendering: content files are
+    examined and read by a pool of threads, both when loading the index and ahead
+    of the rendered pages, and pages rendered in the main process are written by
+    another pool.
+
+    The website is built when the builder is created, unless deferred, in
+    which case it is configured only and built by Builder.build; either way
+    Builder.report describes the last build (alsangue.session.BuildResult).
+    A long-lived builder can build the website again with Builder.rebuild
+    after the content changed. Builders sharing a session (several websites
+    built in one process, see batch) share parsed locales, compiled
+    templates and rendered fragments.
+
+    With a profiler the stages of the build (and every planned or rendered
+    page) are timed, see alsangue.profile.
+
+    While planning, the outputs and their dependencies form a dependency graph
+    (alsangue.graph) telling which pages are dirty and why; in a dry run the
+    website is only planned.
+
+    Pages are written only when their content changed, atomically. Files left
+    in the build directory by previous builds (pages of deleted articles and
+    authors, directories of dropped locales) are listed in Builder.stale and
+    removed when pruning.
+
+    A content file which cannot be read, or a page which cannot be planned or
+    rendered, does not stop the build: its error is listed in Builder.errors
+    and its pages are left as they were, to be rendered again by the next
+    build; stale outputs are not pruned by a build with errors.
+
+    When building incrementally, every written page is logged in a journal
+    (alsangue.manifest.Journal) until the manifest is saved; a build resuming
+    after an interruption takes the logged pages as up to date.
+
     Args:
         content_path (str): path of content directory;
         build_path (str): path where the built files have to reside;
+        incremental (bool): rebuild only pages whose dependencies changed;
+        jobs (int): number of processes rendering the pages;
+        domain (str): url of the website overriding the one in the config file;
+        assets (str): how files in "res" are placed in the build, one of "copy",
+            "hardlink" or "reflink";
+        profiler (Profiler): records time, memory and counters of the build;
+        prune (bool): remove stale outputs;
+        threads (int): number of threads reading and writing files, 0 to
+            read and write them in the rendering thread;
+        dry_run (bool): only plan the pages, see Builder.graph;
+        memory_limit (int): ceiling of the resident memory of every process in
+            bytes, None for no limit;
+        resume (bool): continue an interrupted build from its journal; the
+            build is incremental;
+        session (Session): caches shared with other builders, a new one if None;
+        defer (bool): only configure the builder, see Builder.build;
     """
     alsangue_path = dirname(realpath(__file__))
+    batch_size = 16
 
-    def __init__(self, content_path=alsangue_path, build_path=join(alsangue_path, "build")):
-
-        alsangue_path = dirname(realpath(__file__))
+    def __init__(self, content_path=alsangue_path, build_path=join(alsangue_path, "build"), incremental=False, jobs=1, domain=None, assets="copy", profiler=None, prune=False, threads=0, dry_run=False, memory_limit=None, resume=False, session=None, defer=False):
 
         self.build_path = realpath(build_path)
         self.content_path = realpath(content_path)
+        self.jobs = jobs
+        self.domain = domain
+        self.assets_mode = assets
+        self.profiler = profiler
+        self.prune = prune
+        self.threads = threads
+        self.dry_run = dry_run
+        self.memory_limit = memory_limit
+        self.guard = MemoryGuard(memory_limit)
+        self.resume = resume
+        self.writer = None
+        self.prefetched = None
+        self.rendering = None
+        self.results = None
+        self.outputs = {}
+        self.errors = []
+        self.failures = []
+        self.stale = []
+        self.seconds = 0
+        self.graph = DependencyGraph()
+        self.session = session if session != None else Session()
+        set_profiler(profiler)
+
+        self.cache_path = join(self.build_path, ".alsangue-cache")
+        set_cache(self.cache_path if not dry_run else None)
+        self.fragments = FragmentCache(self.build_path if not dry_run else None, self.session.fragments)
+
+        self.manifest = None
+        self.journal = None
+        if incremental or resume:
+            self.manifest = Manifest(self.build_path, version)
+            self.journal = Journal(self.build_path)
+        self.stamp = None
+        if incremental and not dry_run:
+            self.stamp = stamp(self.content_path, self.build_path, assets, prune, domain)
+
+        self.index = ContentIndex([], [])
+        with stage("configure"):
+            self.configure()
+        if not defer:
+            self.build()
+
+    def configure(self):
+        """Load config, locales and templates settings"""
+        alsangue_path = dirname(realpath(__file__))
+
+        self.config_file = join(self.content_path, "config")
+        self.config = dict_from_file(self.config_file)
+        if self.domain != None:
+            self.config['domain'] = self.domain
 
-        self.config = dict_from_file(join(content_path, "config"))
+        self.locale_files = [realpath(join(alsangue_path, "locales", l)) for l in ls(join(alsangue_path, "locales"))]
+        self.locales = [self.session.locale(l) for l in self.locale_files]
+        self.codes = " ".join(l['code'] for l in self.locales)
 
-        locales = [realpath(join(alsangue_path, "locales", l)) for l in ls(join(alsangue_path, "locales"))]
-        self.locales = [dict_from_file(l) for l in locales]
-        self.build_tree()
+        if not self.config.get("archive-shard") in [None, "year", "month"]:
+            raise ValueError("'archive-shard' has to be 'year' or 'month'")
+        if [f for f in self.config.get("feeds", []) if not f in feed_files] != []:
+            raise ValueError("'feeds' can list only " + ", ".join('"{}"'.format(f) for f in feed_files))
 
-        self.sitemap = Sitemap(build_path)
+        self.templates_path = join(self.content_path, "templates")
+        self.templates = {}
+        self.tasks = []
 
-        self.templates_path = join(content_path, "templates")
-      
-        self.articles = [realpath(join(content_path, "articles", a)) for a in ls(join(content_path, "articles"))]
-        self.authors = [realpath(join(content_path, "authors", a)) for a in ls(join(content_path, "authors"))]
- 
-        for a in self.articles:
-            self.build_article(a)
+        self.assets = Assets(join(self.content_path, "res"), join(self.build_path, "res"),
+                             mode=self.assets_mode, fingerprint=self.config.get("fingerprint-assets", False))
+
+    def build(self):
+        """Build the website
+
+        Returns:
+            (BuildResult) the outcome of the build, see Builder.report
+        """
+        set_profiler(self.profiler)
+        set_cache(self.cache_path if not self.dry_run else None)
+        start = monotonic()
+        try:
+            with stage("build"):
+                self.build_stages()
+        finally:
+            self.seconds = monotonic() - start
+        return self.report()
+
+    def report(self):
+        """Describe the last build
+
+        Returns:
+            (BuildResult) outputs rendered, stale outputs, errors, duration
+            and counters of the profiler, if any
+        """
+        failures = set(self.failures)
+        return BuildResult(self.content_path, self.build_path,
+                           outputs=len(self.graph.outputs),
+                           rendered=[o for o in self.graph.dirty() if not o in failures],
+                           stale=list(self.stale), errors=list(self.errors), seconds=self.seconds,
+                           counters=dict(self.profiler.counters) if self.profiler != None else {},
+                           dry_run=self.dry_run)
+
+    def build_stages(self):
+        """Build the website, see Builder.build"""
+        self.plan()
+        if self.dry_run:
+            for task in self.planned():
+                pass
+            self.build_search()
+            self.stale = self.stale_outputs()
+            return
+
+        if self.journal != None:
+            self.journal.open(resume=self.resume)
+        complete = False
+        try:
+            with stage("render"):
+                self.run_tasks(self.jobs, self.planned())
+            with stage("search"):
+                self.build_search()
+
+            with stage("symlinks"):
+                self.link_homepages()
+
+            with stage("sitemap"):
+                self.sitemap.save()
+            with stage("stale"):
+                self.stale = self.stale_outputs()
+                if self.prune and self.errors == []:
+                    self.remove(self.stale)
+            with stage("compress"):
+                self.compress()
+            if self.manifest != None:
+                with stage("manifest"):
+                    self.manifest.save()
+            self.fragments.save()
+            if self.stamp != None:
+                if self.errors == [] and (self.stale == [] or self.prune):
+                    self.stamp.save()
+                else:
+                    self.stamp.clear()
+            complete = True
+        finally:
+            if self.journal != None:
+                self.journal.close(complete)
+
+    def plan(self):
+        """Load the content before planning the pages, see Builder.planned
+
+        When resuming, the pages in the journal of the interrupted build are
+        taken as up to date. In a dry run nothing is written in the build
+        directory.
+        """
+        if self.dry_run:
+            self.assets.mapping = self.assets.previous()
+        else:
+            with stage("build_tree"):
+                self.build_tree()
+        self.sitemap = Sitemap(self.build_path if not self.dry_run else None, domain=self.config['domain'], gzip=self.config.get("sitemap-gzip", False))
+        self.tasks = []
+        self.outputs = {}
+        self.failures = []
+        self.graph = DependencyGraph()
+        if self.manifest != None:
+            self.manifest.recorded = {}
+            if self.resume and self.journal != None:
+                resumed = self.journal.entries()
+                self.manifest.resume(resumed)
+                count("resumed pages", len(resumed))
+
+        self.articles = [realpath(join(self.content_path, "articles", a)) for a in ls(join(self.content_path, "articles"))]
+        self.authors = [realpath(join(self.content_path, "authors", a)) for a in ls(join(self.content_path, "authors"))]
+        with stage("index"):
+            self.index.load(self.articles, self.authors, self.threads)
+        self.errors = sorted(self.index.errors.items())
+        for l in self.locales:
+            self.license(l)
+
+    def planned(self):
+        """Plan the pages to render
+
+        Every planned page is added to the dependency graph, Builder.graph,
+        and the dirty ones to the render tasks, which are yielded once the
+        pages of a source file are planned. Files which are not in the index,
+        because they could not be read, are skipped.
+
+        Yields:
+            (tuple) render tasks, see Builder.render
+        """
+        steps = [("build_article", a) for a in self.articles]
         for a in self.authors:
-            self.build_author_page(a)
-            self.build_archive(a)
+            steps += [("build_author_page", a), ("build_archive", a)]
+        steps += [("build_taxonomy", kind) for kind in taxonomies]
+        if self.config.get("feeds", []) != []:
+            steps += [("build_feeds", None)] + [("build_feeds", a) for a in self.authors]
+        for name, f in steps:
+            if f in self.index.errors:
+                continue
+            with stage(name, f):
+                try:
+                    getattr(self, name)(f)
+                except Exception as e:
+                    self.errors.append((f, describe(e)))
+            tasks, self.tasks = self.tasks, []
+            yield from tasks
+
+    def link_homepages(self):
+        """Link the homepage of every locale, and of the website, as index.html"""
+        alsangue_path = dirname(realpath(__file__))
 
+        chosen = dict_from_file(join(alsangue_path, "locales", self.config['locale']))
         for l in self.locales:
-            try:
-                ln(join(self.build_path, l['code'], self.config['homepage'] + ".html"), join(self.build_path, l['code'], "index.html"))
-            except FileExistsError as e:
-                rm(join(self.build_path, l['code'], "index.html"))
-                ln(join(self.build_path, l['code'], self.config['homepage'] + ".html"), join(self.build_path, l['code'], "index.html")) 
-            chosen = dict_from_file(join(alsangue_path, "locales", self.config['locale']))
+            link(join(self.build_path, l['code'], self.config['homepage'] + ".html"), join(self.build_path, l['code'], "index.html"))
             if l['code'] == chosen['code']:
+                link(join(self.build_path, chosen['code'], self.config['homepage']+".html"), join(self.build_path, "index.html"))
+
+    def compress(self):
+        """Write precompressed siblings of pages, sitemap and text files in "res"
+
+        Only when "precompress" is set in the config; when it is unset the
+        siblings written by previous builds are removed.
+        """
+        precompressor = Precompressor(self.build_path)
+        if not self.config.get("precompress", False):
+            if precompressor.state != {}:
+                precompressor.run([])
+            return
+        files = [join(self.build_path, o) for o in sorted(self.graph.outputs)]
+        files += [join(self.build_path, f) for f in sorted(ls(self.build_path)) if f == "sitemap.xml" or part_name.match(f)]
+        files += text_files(join(self.build_path, "res"))
+        precompressor.run([f for f in files if not compressed(f)])
+
+    def stale_outputs(self):
+        """Outputs of previous builds which have not been planned by this one
+
+        Everything in the build directory is generated: besides "res", the
+        sitemap, hidden files, the index.html links and the precompressed
+        siblings of files (see Builder.compress), a file is stale if it is
+        not a planned page and a directory is stale if it is not the one of
+        a locale.
+
+        Returns:
+            (list) paths relative to the build directory
+        """
+        codes = [l['code'] for l in self.locales]
+        stale = []
+        if not isdir(self.build_path):
+            return stale
+        for f in sorted(ls(self.build_path)):
+            if f in ["res", "index.html", "sitemap.xml"] or part_name.match(f) or compressed(f) or f in self.graph.outputs:
+                continue
+            if not f in codes or not isdir(join(self.build_path, f)):
+                stale.append(f)
+                continue
+            for root, dirs, files in walk(join(self.build_path, f)):
+                dirs[:] = sorted(d for d in dirs if not hidden(d))
+                for g in sorted(files):
+                    page = relpath(join(root, g), self.build_path)
+                    if not hidden(g) and g != "index.html" and not compressed(g) and not page in self.graph.outputs:
+                        stale.append(page)
+        return stale
+
+    def remove(self, outputs):
+        """Remove outputs, and the directories they leave empty below the ones of the page types
+
+        Args:
+            outputs (list): paths relative to the build directory
+        """
+        for f in outputs:
+            path = join(self.build_path, f)
+            if isdir(path) and not islink(path):
+                rmtree(path)
+            else:
+                rm(path)
+            directory = dirname(path)
+            while relpath(directory, self.build_path).count("/") > 1:
                 try:
-                    ln(join(self.build_path, chosen['code'], self.config['homepage']+".html"), join(self.build_path, "index.html"))
-                except FileExistsError as e:
-                    rm(join(self.build_path, "index.html"))
-                    ln(join(self.build_path, chosen['code'], self.config['homepage']+".html"), join(self.build_path, "index.html")) 
+                    rmdir(directory)
+                except OSError as e:
+                    break
+                directory = dirname(directory)
 
-        self.sitemap.save()
+    def rebuild(self, changed=[]):
+        """Build the website again after some content files changed
+
+        Unchanged pages are skipped when building incrementally.
+
+        Args:
+            changed (list): paths of the changed files; the config is reloaded
+                if it changed and the templates are compiled again if any of
+                them changed
+        Returns:
+            (BuildResult) the outcome of the build, see Builder.report
+        """
+        if self.config_file in changed:
+            with stage("configure"):
+                self.configure()
+        elif [f for f in changed if f.startswith(self.templates_path)] != []:
+            self.templates = {}
+        return self.build()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['sitemap'] = None
+        state['manifest'] = None
+        state['tasks'] = []
+        state['graph'] = None
+        state['writer'] = None
+        state['prefetched'] = None
+        state['journal'] = None
+        state['outputs'] = {}
+        if self.profiler != None:
+            state['profiler'] = Profiler(memory=self.profiler.memory)
+        return state
+
+    def run_tasks(self, jobs=1, tasks=None):
+        """Render the planned pages
+
+        Tasks are distributed to a pool of processes, in batches of
+        Builder.batch_size, when more than one job is requested; only a
+        couple of batches per process are submitted ahead. Otherwise source
+        files are read by a pool of threads ahead of rendering and pages are
+        written by another one. Dates are formatted with the names in the
+        locale files, see alsangue.dates, so rendering does not depend on the
+        process locale.
+
+        Args:
+            jobs (int): number of processes
+            tasks (iterable): render tasks, the planned ones (Builder.tasks) if None
+        """
+        if tasks == None:
+            tasks, self.tasks = self.tasks, []
+        tasks = iter(tasks)
+        if jobs > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(self,)) as pool:
+                pending = deque()
+                for batch in iter(lambda : list(islice(tasks, self.batch_size)), []):
+                    pending.append(pool.submit(_render, batch))
+                    if len(pending) > jobs * 2:
+                        self.merge(pending.popleft().result())
+                    self.guard.check()
+                while pending:
+                    self.merge(pending.popleft().result())
+        else:
+            limit = Writer.limit if self.memory_limit == None else min(Writer.limit, self.memory_limit // 4)
+            with Writer(self.threads, limit) if self.threads > 0 else nullcontext() as writer:
+                self.writer = writer
+                reclaim = [writer.drain] if writer != None else []
+                try:
+                    for t, document in prefetch(self.read_task, tasks, self.threads):
+                        self.prefetched = (t[1], document)
+                        self.render(t)
+                        self.prefetched = None
+                        self.guard.check(*reclaim)
+                finally:
+                    self.writer = None
+                    self.prefetched = None
+
+    def merge(self, result):
+        """Take the outcome of tasks rendered by a worker process, see _render"""
+        records, results, fragments = result
+        if records != None and self.profiler != None:
+            self.profiler.merge(*records)
+        self.fragments.merge(fragments)
+        for task, error in results:
+            if error == None:
+                self.done(task)
+            else:
+                self.failed(task, error)
+
+    def schedule(self, page, task):
+        """Add a render task
+
+        Args:
+            page (str): path of the page it renders, relative to the build directory
+            task (tuple): the task, see Builder.render
+        """
+        self.tasks.append(task)
+        self.outputs[task] = page
+
+    def done(self, task):
+        """Log a rendered page in the journal, once it is saved"""
+        if task == None:
+            return
+        if self.results != None:
+            self.results.append((task, None))
+            return
+        page = self.outputs.pop(task)
+        if self.journal != None:
+            self.journal.record(page, self.graph.outputs[page])
+
+    def failed(self, task, error):
+        """Record the error of a render task
+
+        The page is left as it is and dropped from the manifest, so that the
+        next build renders it again.
+
+        Args:
+            task (tuple): the task, see Builder.render
+            error (str): description of the error
+        """
+        if self.results != None:
+            self.results.append((task, error))
+            return
+        page = self.outputs.pop(task)
+        self.failures.append(page)
+        self.errors.append((task[1] if task[1] != None else page, page + ": " + error))
+        if self.manifest != None:
+            self.manifest.recorded.pop(page, None)
+
+    def write_failed(self, task, error):
+        """Record the error raised while writing the page of a render task, see Builder.failed"""
+        self.failed(task, describe(error))
+
+    def read_task(self, task):
+        """Read the source file of a render task, see Builder.document"""
+        if task[0] in ["article", "author_page"]:
+            return dict_from_file(task[1])
+        return None
+
+    def document(self, f):
+        """Content of a source file, prefetched when rendering serially
+
+        Args:
+            f (str): path of the file
+        Returns:
+            (dict) the content of the file
+        """
+        if self.prefetched != None and self.prefetched[0] == f and self.prefetched[1] != None:
+            return self.prefetched[1]
+        return dict_from_file(f)
+
+    def save(self, code, f):
+        """Save a page, in the background when a writer is running
+
+        The page is minified when "minify" is set in the config. The task
+        being rendered is done once the page is saved, see Builder.done; if
+        the page cannot be written in the background, the task fails as if
+        rendering it had failed, see Builder.write_failed.
+
+        Args:
+            code (str or bytes): content of the page
+            f (str): path of the page
+        """
+        if self.config.get("minify", False) and f.endswith(".html"):
+            code = minify_html(code)
+        if self.writer != None:
+            failed = partial(self.write_failed, self.rendering) if self.rendering != None else None
+            self.writer.save(code, f, partial(self.done, self.rendering), failed)
+        else:
+            save(code, f)
+            self.done(self.rendering)
+
+    def render(self, task):
+        """Execute a render task
+
+        Errors are recorded, see Builder.failed, instead of being raised.
+
+        Args:
+            task (tuple): page kind ("article", "author_page", "archive", "taxonomy"
+                or "feed"), path of the source file (the taxonomy of taxonomy
+                pages), code of the locale of the page and further arguments
+                of the render method, if any
+        """
+        kind, path, code, *arguments = task
+        with stage("render_" + kind, path):
+            self.rendering = task
+            try:
+                getattr(self, "render_" + kind)(path, code, *arguments)
+            except Exception as e:
+                self.failed(task, describe(e))
+            finally:
+                self.rendering = None
+
+    def template(self, name):
+        """Return a template, compiled once per build and per session
+
+        Args:
+            name (str): file name of the template in the "templates" directory
+        Returns:
+            (Template) the compiled template
+        """
+        if not name in self.templates:
+            self.templates[name] = self.session.template(self.assets.rewrite(load(join(self.templates_path, name))))
+        return self.templates[name]
+
+    def dependencies(self, l, template, *files):
+        """Collect the dependencies shared by every page
+
+        Args:
+            l (dict): locale of the page
+            template (str): path of the template of the page, None if it has none
+            files (str): paths of further input files of the page
+        Returns:
+            (dict) dependency names mapped to their signatures
+        """
+        if self.manifest == None:
+            return {}
+        fingerprint = self.manifest.fingerprint
+        deps = {"locales":self.codes,
+                "domain":self.config['domain'],
+                self.config_file:fingerprint(self.config_file)}
+        deps[self.locale_files[self.locales.index(l)]] = fingerprint(self.locale_files[self.locales.index(l)])
+        for f in (template,) + files:
+            if f != None:
+                deps[f] = fingerprint(f)
+        if self.assets.fingerprint:
+            deps["assets"] = " ".join(self.assets.mapping.values())
+        return deps
+
+    def outdated(self, page, deps):
+        """Tell if a page has to be rendered
+
+        Args:
+            page (str): path of the page relative to the build directory
+            deps (dict): dependencies of the page, see Builder.dependencies
+        Returns:
+            (bool) always True when not building incrementally
+        Note:
+            The page is added to the dependency graph and its dependencies
+            are recorded in the manifest for the next build.
+        """
+        if self.manifest == None:
+            self.graph.add(page, deps, ["full build"])
+            return True
+        self.manifest.record(page, deps)
+        reasons = self.manifest.changes(page, deps)
+        self.graph.add(page, deps, reasons)
+        return reasons != []
 
     def build_tree(self):
         """Create directories structure in build directory
@@ -226,8 +698,11 @@ class Builder:
             mkdir(join(self.build_path, "res"))
         except FileExistsError as e:
             pass
-        for f in ls(join(self.content_path, "res")):
-            cp(join(self.content_path, "res", f), join(self.build_path, "res", f))
+        mapping = self.assets.mapping
+        with stage("assets"):
+            self.assets.sync()
+        if self.assets.mapping != mapping and self.assets.fingerprint:
+            self.templates = {}
 
         for l in self.locales:
             try:
@@ -241,84 +716,126 @@ class Builder:
                     pass
 
     def build_article(self, article): 
-        """Build an html page for an article
+        """Plan the html pages of an article
 
         For any language present in the "locales" directory the function will check if the
-        article is translated in that particular locale and publish a page for that language.
+        article is translated in that particular locale and plan a page for that language.
 
         The articles will be created using the "article.html" template in the homonym directory.
 
         Args:
             article (str): path of the article file. See example directory to know how to populate it.
         """
-        document = dict_from_file(article)
-        locales = [loc for loc in self.locales if loc["ISO/IEC 15897"] in document.keys()]
+        record = self.index.by_path[article]
+        locales = [loc for loc in self.locales if loc["ISO/IEC 15897"] in record.titles]
 
-        article_name = article.split("/")[-1]
-        article_page = join("articles", article_name + ".html")
+        article_page = join("articles", record.name + ".html")
         article_path = {}
-        loc = {}
         for l in locales:
             article_path[l["code"]] = join(self.config['domain'], l["code"], article_page)
 
-        template = load(join(self.templates_path, "article.html"))
+        author_file = None
+        author_record = self.index.author_of(record)
+        if author_record != None:
+            author_file = author_record.path
 
-        for l in locales:
-            soup = BeautifulSoup(template, 'lxml')
-            locale.setlocale(locale.LC_ALL, l["ISO/IEC 15897"])
-            html_tag = soup.find(id="html")
-            html_tag.attrs["lang"] = l["code"]
-
-            # HEAD
-            head = soup.find(id="head")
-            head.attrs['lang'] = l['code']
-            title = soup.new_tag("title")
-            title.append(document[l["ISO/IEC 15897"]]["title"])
-            head.append(title)
- 
-            author = soup.find(id="author")
-            author.string = document["author"]
-
-            for a in self.authors:
-                if dict_from_file(a)['author'] == document['author']:
-                    author_path = join(self.config['domain'], l['code'], "authors", a.split("/")[-1] + ".html")
-
-            author.attrs["href"] = author_path 
-
-            title = soup.find(id="title")
-            title.string = document[l["ISO/IEC 15897"]]["title"]
-
-            content = soup.find(id="content")
-            content_soup = BeautifulSoup(document[l["ISO/IEC 15897"]]['content'], 'html.parser')
-            content.append(content_soup)
-
-            if "date" in document.keys():
-                date = soup.find(id="date")
-                date.string = l["created"] + date_print(document["date"])
-
-            lastedit = soup.find(id="last-edit")
-            lastedit.string = l["last-edit"] + getlastedit(article) 
- 
-            locales_tag = soup.find(id="locales")
-            for m in locales:
-                if m == l:
-                    locales_content = "".join(["[", m["code"], "]"])
-                    locales_tag.append(locales_content)
-                else:
-                    locale_tag = soup.new_tag("a", attrs={"href":article_path[m['code']]})
-                    locale_tag.append(m["code"])
-                    locales_tag.append("[")
-                    locales_tag.append(locale_tag)
-                    locales_tag.append("]")
-    
-            license_tag = soup.find(id="license")
-            license_soup = BeautifulSoup(l[self.config["license"]], 'html.parser')
-            license_tag.append(license_soup)
+        template_file = join(self.templates_path, "article.html")
 
+        for l in locales:
             article_sitemap = copy(article_path[l['code']])
-            self.sitemap.add_url(article_sitemap, getlastedit(article, sitemap=True), locales=article_path, changefreq='monthly', priority='0.8')
+            self.sitemap.add_url(article_sitemap, date_from_epoch(record.mtime, sitemap=True), locales=article_path, changefreq='monthly', priority='0.8')
 
-            save(str(soup), join(self.build_path, l['code'], article_page))
+            deps = self.dependencies(l, template_file, article, author_file)
+            deps["last-edit"] = date_from_epoch(record.mtime, sitemap=True)
+            if record.tags + record.categories != ():
+                deps["taxonomy"] = " ".join(self.taxonomy_page(kind, t) for kind in taxonomies for t in getattr(record, kind))
+            if self.outdated(join(l['code'], article_page), deps):
+                self.schedule(join(l['code'], article_page), ("article", article, l['code']))
+
+    def render_article(self, article, code):
+        """Render the html page of an article in a locale
+
+        Args:
+            article (str): path of the article file
+            code (str): code of the locale of the page
+        """
+        document = self.document(article)
+        record = self.index.by_path[article]
+        locales = [loc for loc in self.locales if loc["ISO/IEC 15897"] in document.keys()]
+        l = [loc for loc in locales if loc['code'] == code][0]
+
+        article_page = join("articles", record.name + ".html")
+        article_path = {}
+        for m in locales:
+            article_path[m["code"]] = join(self.config['domain'], m["code"], article_page)
+
+        template = self.template("article.html")
+
+        title = document[l["ISO/IEC 15897"]]["title"]
+        slots = {"html":{"attrs":{"lang":l["code"]}},
+                 "head":{"attrs":{"lang":l["code"]}, "append":element("title", title)},
+                 "author":{"text":document["author"]},
+                 "title":{"text":title},
+                 "content":{"append":fragment(document[l["ISO/IEC 15897"]]['content'])},
+                 "last-edit":{"text":l["last-edit"] + date_from_epoch(record.mtime, l=l)},
+                 "locales":{"append":self.locale_switcher(l, locales, article_path)},
+                 "license":{"append":self.license(l)}}
+
+        author_record = self.index.author_of(record)
+        if author_record != None:
+            slots["author"]["attrs"] = {"href":join(self.config['domain'], l['code'], "authors", author_record.name + ".html")}
+
+        if "date" in document.keys():
+            slots["date"] = {"text":l["created"] + date_print(document["date"], l)}
+
+        for kind in taxonomies:
+            if kind in template.ids and getattr(record, kind) != ():
+                links = [element("a", t, href=join(self.config['domain'], l['code'], self.taxonomy_page(kind, t)), class_=kind)
+                         for t in getattr(record, kind)]
+                slots[kind] = {"append":" ".join(links)}
+
+        self.save(template.render(slots), join(self.build_path, l['code'], article_page))
+
+    def license(self, l):
+        """Html code of the license notice of a locale, normalized once per build
+
+        The notice is the "license" key of the config in the locale file; it
+        is kept in the fragment cache (Builder.fragments), so it is parsed
+        only when it changes. It is rendered before the pages are, so that
+        worker processes find it in the cache too.
+
+        Args:
+            l (dict): locale of the page
+        Returns:
+            (str) html code
+        """
+        source = l[self.config["license"]]
+        return self.fragments.get("license", l["code"], source, lambda : fragment(source))
+
+    def locale_switcher(self, l, locales, paths):
+        """Html code of the links to the other locales of a page
+
+        The markup is taken from the fragment cache, with the urls of the
+        page spliced in.
+
+        Args:
+            l (dict): locale of the page
+            locales (list): locales the page is available in
+            paths (dict): urls of the page keyed by locale code
+        Returns:
+            (str) html code, i.e. [en][<a href="...">it</a>]
+        """
+        codes = [m["code"] for m in locales]
+        def render():
+            code = []
+            for m in codes:
+                if m == l["code"]:
+                    code.append("[" + m + "]")
+                else:
+                    code.append("[" + element("a", m, href="\x00" + m + "\x00") + "]")
+            return "".join(code)
+        switcher = self.fragments.get("locale switcher", l["code"], codes, render)
+        return url_marker.sub(lambda match : escape(paths[match.group(1)]), switcher)
 
     def select_articles(self, locale, sort="last_edit_recent_to_old", author=None):
         """Select articles according to different criteria.
@@ -331,17 +848,14 @@ class Builder:
         Returns:
             (list) paths of selected articles
         """
-        articles = [a for a in self.articles if locale in dict_from_file(a).keys()]
-        if sort == "last_edit_recent_to_old":
-            sorted_indexes = sorted(range(len(articles)), key=lambda k: getmtime(articles[k]), reverse=True)
-            articles = [articles[i] for i in sorted_indexes]
-        if author != None:
-            author_articles = [a for a in articles if dict_from_file(a)["author"] == author]
-            return author_articles
+        articles = [a.path for a in self.index.select(locale, author=author)]
+        if sort != "last_edit_recent_to_old":
+            position = {a:i for i, a in enumerate(self.articles)}
+            articles = sorted(articles, key=lambda a : position[a])
         return articles
 
     def build_author_page(self, author):
-        """Builds personal page of the author.
+        """Plan the personal pages of the author.
 
         Args:
             author (str): path of the author file. It has to be a Python dictionary
@@ -359,250 +873,823 @@ class Builder:
         Note:
             Produces an html page in {/language_code/}authors/
         """
-        document = dict_from_file(author)
+        record = self.index.by_path[author]
 
-        author_name = author.split("/")[-1]
-        author_page = join("authors", author_name + ".html")
-        archive_page = join("archive", author_name + ".html")
+        author_page = join("authors", record.name + ".html")
         author_path = {}
-        archive_path = {}
         for l in self.locales:
             author_path[l["code"]] = join(self.config['domain'], l['code'], author_page)
-            archive_path[l["code"]] = join(self.config['domain'], l['code'], archive_page)
 
-        template = load(join(self.templates_path, "author.html"))
+        template_file = join(self.templates_path, "author.html")
 
         for l in self.locales:
-            soup = BeautifulSoup(template, 'lxml')
-
-            html_tag = soup.find(id="html")
-            html_tag.attrs["lang"] = l["code"]
-
-            # HEAD
-            head = soup.find(id="head")
-            head.attrs['lang'] = l['code']
-            page_title = soup.new_tag("title")
-            page_title.append(document["author"])
-            head.append(page_title)
-
-            author_tag = soup.find(id="author")
-            author_tag.string = document["author"]
-
-            sections = soup.find(id="sections")
-
-            articles = soup.new_tag("div", id="last-articles")
-            sections.append(articles)
-            title = soup.new_tag("h2")
-            title.append(l["articles"])
-            articles.append(title)
-            ul = soup.new_tag("ul")
-
-            showcase_articles = self.select_articles(l["ISO/IEC 15897"], author=document['author'])
- 
-            for a in showcase_articles[0:5]:
-                article = dict_from_file(a)
-                
-                article_path = join(self.config['domain'], l['code'], "articles", a.split("/")[-1] + ".html")
-                li = soup.new_tag("li")
-                a = soup.new_tag("a", attrs={"href":article_path})
-                a.append(article[l["ISO/IEC 15897"]]["title"])
-                li.append(a)
-                ul.append(li)
-
-            if len(showcase_articles) > 5:
-                more_articles_soup = soup.new_tag("a", id="archive", attrs={"class":"archive", "href":archive_path})
-                more_articles_soup.append(l["archive"])
-                ul.append(more_articles_soup)
-            articles.append(ul)
-
-            doc_sections = [s for s in document["sections"] if l["ISO/IEC 15897"] in s.keys()]
-
-            for s in doc_sections:
-                section = soup.new_tag("div", id=sub(" ", "_", s[l["ISO/IEC 15897"]]["title"]))
-                title = soup.new_tag("h2")
-                title.append(s[l["ISO/IEC 15897"]]["title"])
-                content = soup.new_tag("div")
-                content_soup = BeautifulSoup(s[l["ISO/IEC 15897"]]["content"], "html.parser")
-                content.append(content_soup)
-                section.append(title)
-                section.append(content)
-                sections.append(section)
-
-            contacts = soup.find(id="contacts")
-            title = soup.new_tag("h2")
-            title.append(l["contacts"])
-            contacts.append(title)
-            contact_types = soup.new_tag("ul", id="contact_types")
-
-            if 'xmpp' in document.keys():
-                xmpp = soup.new_tag("li", id="xmpp")
-                xmpp_link = soup.new_tag("a", id="xmpp_link", attrs={"href":"xmpp:"+document["xmpp"]})
-                xmpp_link.append(document['xmpp'])
-                xmpp.append("XMPP: ")
-                xmpp.append(xmpp_link)
-                contact_types.append(xmpp)
-
-            if 'email' in document.keys():
-                email = soup.new_tag("li", id="email")
-                email_link = soup.new_tag("a", id="email_link", attrs={"href":"mailto:"+document["email"]})
-                email_link.append(document["email"])
-                email.append("Email: ")
-                email.append(email_link)
-                contact_types.append(email)
-
-            if 'pgp' in document.keys():
-                pgp = soup.new_tag("li", id="pgp")
-                pgp.append("PGP: ")
-                pgp_fingerprint = soup.new_tag("span", attrs={"class":"hash"})
-                pgp_fingerprint.string = document["pgp"]
-                pgp.append(pgp_fingerprint)
-                contact_types.append(pgp)
-
-            if 'doge' in document.keys():
-                doge = soup.new_tag("li", id="doge")
-                doge.append("DOGE: ")
-                doge_address = soup.new_tag("span", attrs={"class":"hash"})
-                doge_address.string = document["doge"]
-                doge.append(doge_address)
-                contact_types.append(doge)
-
-            if 'btc' in document.keys():
-                btc = soup.new_tag("li", id="btc")
-                btc.append("BTC: ")
-                btc_address = soup.new_tag("span", attrs={"class":"hash"})
-                btc_address.string = document["btc"]
-                btc.append(btc_address)
-                contact_types.append(btc)
-
-            if 'paypal' in document.keys():
-                paypal = soup.new_tag("li", id="paypal")
-                paypal_link = soup.new_tag("a", id="paypal_link", attrs={"href":join("https://paypal.me/", document["paypal"])})
-                paypal_link.append(document["paypal"])
-                paypal.append("Paypal: ")
-                paypal.append(paypal_link)
-                contact_types.append(paypal)
-
-            contacts.append(contact_types)
-            sections.append(contacts)       
-            
-            locales_tag = soup.find(id="locales")
-            for m in self.locales:
-                if m == l:
-                    locales_content = "[" + m["code"] + "]"
-                    locales_tag.append(locales_content)
-                else:
-                    locale_tag = soup.new_tag("a", attrs={"href":author_path[m["code"]]})
-                    locale_tag.append(m["code"])
-                    locales_tag.append("[")
-                    locales_tag.append(locale_tag)
-                    locales_tag.append("]")
-           
-            license_tag = soup.find(id="license")
-            license_soup = BeautifulSoup(l[self.config["license"]], 'html.parser')
-            license_tag.append(license_soup)
+            self.sitemap.add_url(author_path[l['code']], date_from_epoch(record.mtime, sitemap=True), locales=author_path, changefreq='monthly', priority='1')
+
+            showcase_articles = self.select_articles(l["ISO/IEC 15897"], author=record.author)
+
+            deps = self.dependencies(l, template_file, author, *showcase_articles[0:5])
+            deps["showcase"] = " ".join(showcase_articles[0:6])
+            deps["archive"] = self.archive_slices(record, l)[0][2]
+            if self.outdated(join(l['code'], author_page), deps):
+                self.schedule(join(l['code'], author_page), ("author_page", author, l['code']))
+
+    def render_author_page(self, author, code):
+        """Render the personal page of the author in a locale
+
+        Args:
+            author (str): path of the author file, see Builder.build_author_page
+            code (str): code of the locale of the page
+        """
+        document = self.document(author)
+        l = [loc for loc in self.locales if loc['code'] == code][0]
+
+        record = self.index.by_path[author]
+        author_page = join("authors", record.name + ".html")
+        author_path = {}
+        for m in self.locales:
+            author_path[m["code"]] = join(self.config['domain'], m['code'], author_page)
+        archive_url = join(self.config['domain'], l['code'], self.archive_slices(record, l)[0][2])
+
+        template = self.template("author.html")
+
+        showcase_articles = self.select_articles(l["ISO/IEC 15897"], author=document['author'])
+
+        items = []
+        for a in showcase_articles[0:5]:
+            article = self.index.by_path[a]
+            article_path = join(self.config['domain'], l['code'], "articles", article.name + ".html")
+            items.append(element("li", html=element("a", article.titles[l["ISO/IEC 15897"]], href=article_path)))
+
+        if len(showcase_articles) > 5:
+            items.append(element("a", l["archive"], id="archive", class_="archive", href=archive_url))
+
+        sections = [element("div", html=element("h2", l["articles"]) + element("ul", html="".join(items)), id="last-articles")]
+
+        doc_sections = [s for s in document["sections"] if l["ISO/IEC 15897"] in s.keys()]
+
+        for s in doc_sections:
+            title = s[l["ISO/IEC 15897"]]["title"]
+            content = element("div", html=fragment(s[l["ISO/IEC 15897"]]["content"]))
+            sections.append(element("div", html=element("h2", title) + content, id=sub(" ", "_", title)))
+
+        contact_types = []
+
+        if 'xmpp' in document.keys():
+            xmpp_link = element("a", document["xmpp"], id="xmpp_link", href="xmpp:"+document["xmpp"])
+            contact_types.append(element("li", html="XMPP: " + xmpp_link, id="xmpp"))
+
+        if 'email' in document.keys():
+            email_link = element("a", document["email"], id="email_link", href="mailto:"+document["email"])
+            contact_types.append(element("li", html="Email: " + email_link, id="email"))
+
+        if 'pgp' in document.keys():
+            pgp_fingerprint = element("span", document["pgp"], class_="hash")
+            contact_types.append(element("li", html="PGP: " + pgp_fingerprint, id="pgp"))
+
+        if 'doge' in document.keys():
+            doge_address = element("span", document["doge"], class_="hash")
+            contact_types.append(element("li", html="DOGE: " + doge_address, id="doge"))
+
+        if 'btc' in document.keys():
+            btc_address = element("span", document["btc"], class_="hash")
+            contact_types.append(element("li", html="BTC: " + btc_address, id="btc"))
 
-            self.sitemap.add_url(author_path[l['code']], getlastedit(author, sitemap=True), locales=author_path, changefreq='monthly', priority='1')
+        if 'paypal' in document.keys():
+            paypal_link = element("a", document["paypal"], id="paypal_link", href=join("https://paypal.me/", document["paypal"]))
+            contact_types.append(element("li", html="Paypal: " + paypal_link, id="paypal"))
 
-            save(str(soup), join(self.build_path, l['code'], author_page))
+        contacts = element("h2", l["contacts"]) + element("ul", html="".join(contact_types), id="contact_types")
+
+        slots = {"html":{"attrs":{"lang":l["code"]}},
+                 "head":{"attrs":{"lang":l["code"]}, "append":element("title", document["author"])},
+                 "author":{"text":document["author"]},
+                 "sections":{"append":"".join(sections)},
+                 "contacts":{"append":contacts},
+                 "locales":{"append":self.locale_switcher(l, self.locales, author_path)},
+                 "license":{"append":self.license(l)}}
+
+        self.save(template.render(slots), join(self.build_path, l['code'], author_page))
+
+    def archive_slices(self, record, l):
+        """Split the archive of an author in a locale in pages
+
+        Articles are taken, from the last to the oldest edited one, in a single
+        pass; with "archive-shard" in the config they are grouped by the year
+        ("year") or the month ("month") of their date, most recent first, and
+        with "archive-page-size" every group is split in pages of that size.
+        Without both settings the archive is a single page. An author without
+        articles in the locale gets a single empty page.
+
+        Args:
+            record (Author): record of the author
+            l (dict): locale of the archive
+        Returns:
+            (list) (shard, number, page, articles) tuples: shard label (i.e. "2018/05")
+            or None, page number, path of the page relative to the locale
+            directory and the Article records on the page
+        """
+        size = self.config.get("archive-page-size", 0)
+        shard = self.config.get("archive-shard")
+
+        shards = {}
+        for a in self.index.select(l["ISO/IEC 15897"], author=record.author):
+            key = None
+            if shard != None:
+                date = (a.date if a.date != None else strftime("%Y/%m/%d", localtime(a.mtime))).split("/")
+                key = "{:04d}".format(int(date[0])) if shard == "year" else "{:04d}/{:02d}".format(int(date[0]), int(date[1]))
+            shards.setdefault(key, []).append(a)
+
+        if size == 0 and shard == None:
+            return [(None, 1, join("archive", record.name + ".html"), shards.get(None, []))]
+
+        slices = []
+        for key in sorted(shards, reverse=True) if shard != None and shards != {} else [None]:
+            articles = shards.get(key, [])
+            step = size if size > 0 else max(len(articles), 1)
+            for n, i in enumerate(range(0, max(len(articles), 1), step), 1):
+                path = [record.name] + ([key] if key != None else []) + ["page-{}.html".format(n)]
+                slices.append((key, n, join("archive", *path), articles[i:i + step]))
+        return slices
+
+    def archive_locales(self, record):
+        """Locales in which an author has written articles, with the pages of their archives
+
+        Args:
+            record (Author): record of the author
+        Returns:
+            (tuple) list of the locales and dictionary of the archive slices keyed
+            by locale code, see Builder.archive_slices
+        """
+        locales = []
+        slices = {}
+        for l in self.locales:
+            slices[l['code']] = self.archive_slices(record, l)
+            if slices[l['code']][0][3] != []:
+                locales.append(l)
+        return locales, slices
+
+    def archive_paths(self, locales, slices, page):
+        """Urls the locale switcher of an archive page links to
+
+        Every locale links to the same page of its archive, if it has one,
+        or to its first page otherwise.
+
+        Args:
+            locales (list): locales of the archive, see Builder.archive_locales
+            slices (dict): archive slices keyed by locale code
+            page (str): path of the page relative to the locale directory
+        Returns:
+            (dict) urls keyed by locale code
+        """
+        paths = {}
+        for m in locales:
+            same = [s[2] for s in slices[m['code']] if s[2] == page]
+            paths[m['code']] = join(self.config['domain'], m['code'], (same + [slices[m['code']][0][2]])[0])
+        return paths
 
     def build_archive(self, author):
-        """Builds an archive page containing authors article
+        """Plan the archive pages containing authors article
+
+        Every page depends only on its own articles and on the list of pages
+        it links to, so that a change rebuilds only the affected pages.
 
         Args:
             author (str): path of the author file
         Note:
-            Produces an html page in {/language_code/}archive/author
+            Produces html pages in {/language_code/}archive/author, see Builder.archive_slices
         """
-        document = dict_from_file(author)
+        record = self.index.by_path[author]
+        locales, slices = self.archive_locales(record)
 
-        locales = []
-        for l in self.locales:
-            l['articles'] = self.select_articles(l["ISO/IEC 15897"], author=document['author'])
-            if l['articles'] != []:
-               locales.append(l)
+        template_file = join(self.templates_path, "archive.html")
+
+        for l in locales:
+            for shard, n, page, articles in slices[l['code']]:
+                paths = {}
+                for m in locales:
+                    if page in [s[2] for s in slices[m['code']]]:
+                        paths[m['code']] = join(self.config['domain'], m['code'], page)
+                self.sitemap.add_url(paths[l['code']], date_from_epoch(record.mtime, sitemap=True), locales=paths, changefreq='monthly', priority='0.5')
+
+                deps = self.dependencies(l, template_file, author, *[a.path for a in articles])
+                deps["archive"] = " ".join(a.path for a in articles)
+                deps["archive locales"] = " ".join(self.archive_paths(locales, slices, page).values())
+                deps["archive pages"] = " ".join(s[2] for s in slices[l['code']] if s[0] == shard or s[1] == 1)
+                if self.outdated(join(l['code'], page), deps):
+                    self.schedule(join(l['code'], page), ("archive", author, l['code'], page))
+
+    def render_archive(self, author, code, page=None):
+        """Render an archive page of an author in a locale
 
-        author_name = author.split("/")[-1]
+        Args:
+            author (str): path of the author file
+            code (str): code of the locale of the page
+            page (str): path of the page relative to the locale directory,
+                the first one if None
+        """
+        document = self.index.by_path[author]
+        locales, slices = self.archive_locales(document)
+        l = [loc for loc in locales if loc['code'] == code][0]
+        pages = slices[l['code']]
+        shard, number, page, articles = [s for s in pages if s[2] == page or page == None][0]
+
+        author_name = document.name
         author_page = join("authors", author_name + ".html")
         author_path = {}
-        for l in locales:
-            author_path[l['code']] = join(self.config['domain'], l['code'], author_page)
+        for m in locales:
+            author_path[m['code']] = join(self.config['domain'], m['code'], author_page)
+
+        template = self.template("archive.html")
+
+        archive_path = self.archive_paths(locales, slices, page)
+
+        items = []
+        for article in articles:
+            url = join(self.config['domain'], l['code'], "articles", article.name + ".html")
+            items.append(element("li", html=element("a", article.titles[l["ISO/IEC 15897"]], href=url)))
+        body = element("ul", html="".join(items), id="articles")
+
+        if len(pages) > 1:
+            links = []
+            shard_pages = len([s for s in pages if s[0] == shard])
+            for s in pages:
+                if s[0] != shard and s[1] == 1:
+                    links.append("[" + element("a", s[0], href=join(self.config['domain'], l['code'], s[2])) + "]")
+                elif s[0] == shard:
+                    label = str(s[1])
+                    if s[0] != None:
+                        label = s[0] if shard_pages == 1 else "{} ({})".format(s[0], s[1])
+                    if s[2] == page:
+                        links.append("[" + label + "]")
+                    else:
+                        links.append("[" + element("a", label, href=join(self.config['domain'], l['code'], s[2])) + "]")
+            body += element("div", html="".join(links), id="pages", class_="pages")
+
+        title = l["archive"] if shard == None else l["archive"] + " " + shard
+
+        slots = {"html":{"attrs":{"lang":l["code"]}},
+                 "head":{"attrs":{"lang":l["code"]}, "append":element("title", l["archive head"] + document.author)},
+                 "author":{"text":document.author, "attrs":{"href":author_path[l['code']]}},
+                 "title":{"text":title},
+                 "body":{"append":body},
+                 "locales":{"append":self.locale_switcher(l, locales, archive_path)},
+                 "license":{"append":self.license(l)}}
+
+        makedirs(join(self.build_path, l['code'], dirname(page)), exist_ok=True)
+        self.save(template.render(slots), join(self.build_path, l['code'], page))
+
+    def taxonomy_page(self, kind, term=None):
+        """Path of a taxonomy page relative to the locale directory
 
-        template = load(join(self.templates_path, "archive.html"))
+        Args:
+            kind (str): the taxonomy, "tags" or "categories"
+            term (str): the term listed by the page, None for the index of
+                the terms
+        Returns:
+            (str) i.e. tags/index.html or tags/term.html
+        """
+        if term == None:
+            return join(kind, "index.html")
+        return join(kind, self.index.slug(kind, term) + ".html")
 
-        archive_page = join("archive", author_name + ".html")
-        archive_path = {}
-        for l in locales:
-            archive_path[l['code']] = join(self.config['domain'], l['code'], archive_page)
+    def taxonomy_articles(self, l, kind, term):
+        """Articles of a taxonomy term in a locale, from the last to the first published
+
+        Articles without a date are placed by their last edit, as in archives.
 
+        Args:
+            l (dict): locale of the page
+            kind (str): the taxonomy, "tags" or "categories"
+            term (str): the term
+        Returns:
+            (list) Article records
+        """
+        day = lambda a : a.date if a.date != None else strftime("%Y/%m/%d", localtime(a.mtime))
+        return sorted(self.index.members(l["ISO/IEC 15897"], kind, term), key=lambda a : (day(a), a.name), reverse=True)
+
+    def taxonomy_locales(self, kind, term=None):
+        """Locales having a taxonomy page, see Builder.taxonomy_page"""
+        if term == None:
+            return [l for l in self.locales if self.index.terms(l["ISO/IEC 15897"], kind) != []]
+        return [l for l in self.locales if self.index.members(l["ISO/IEC 15897"], kind, term) != []]
+
+    def build_taxonomy(self, kind):
+        """Plan the pages of a taxonomy in every locale
+
+        Articles list their terms in the "tags" and "categories" fields. In
+        every locale with tagged articles a page indexes the terms and
+        another one lists the articles of every term; the terms and their
+        articles are taken from the inverted index (ContentIndex.members), so
+        article files are not read. A page depends only on its members (name,
+        title and date of the articles, or terms and counts for the index)
+        and on the locales it is translated in, so adding an article renders
+        again only the pages of its terms and the index.
+
+        Args:
+            kind (str): the taxonomy, "tags" or "categories"
+        Note:
+            Produces {/language_code/}tags/index.html and {/language_code/}tags/term.html
+            (and the same for categories), with the archive.html template
+        """
+        template_file = join(self.templates_path, "archive.html")
+        domain = self.config['domain']
 
+        locales = self.taxonomy_locales(kind)
+        index_page = self.taxonomy_page(kind)
+        index_path = {m['code']:join(domain, m['code'], index_page) for m in locales}
         for l in locales:
+            terms = self.index.terms(l["ISO/IEC 15897"], kind)
+            self.sitemap.add_url(index_path[l['code']], locales=index_path, changefreq='weekly', priority='0.3')
+            deps = self.dependencies(l, template_file)
+            deps["taxonomy"] = "\n".join("{} {} {}".format(t, self.index.slug(kind, t), len(self.index.members(l["ISO/IEC 15897"], kind, t))) for t in terms)
+            deps["taxonomy locales"] = " ".join(index_path)
+            if self.outdated(join(l['code'], index_page), deps):
+                self.schedule(join(l['code'], index_page), ("taxonomy", kind, l['code']))
+
+            for t in terms:
+                page = self.taxonomy_page(kind, t)
+                paths = {m['code']:join(domain, m['code'], page) for m in self.taxonomy_locales(kind, t)}
+                articles = self.taxonomy_articles(l, kind, t)
+                lastmod = date_from_epoch(max(a.mtime for a in articles), sitemap=True)
+                self.sitemap.add_url(paths[l['code']], lastmod, locales=paths, changefreq='weekly', priority='0.3')
+                deps = self.dependencies(l, template_file)
+                deps["taxonomy"] = "\n".join("{} {} {}".format(a.name, a.date, a.titles[l["ISO/IEC 15897"]]) for a in articles)
+                deps["taxonomy term"] = t
+                deps["taxonomy locales"] = " ".join(paths)
+                if self.outdated(join(l['code'], page), deps):
+                    self.schedule(join(l['code'], page), ("taxonomy", kind, l['code'], t))
+
+    def render_taxonomy(self, kind, code, term=None):
+        """Render a taxonomy page in a locale
 
-            soup = BeautifulSoup(template, "lxml")
-
-            html_tag = soup.find(id="html")
-            html_tag.attrs["lang"] = l["code"]
-
-            # HEAD
-            head = soup.find(id="head")
-            head.attrs['lang'] = l['code']
-            page_title = soup.new_tag("title")
-            page_title.append(l["archive head"] + document["author"])
-            head.append(page_title)
-      
-            author_head = soup.find(id="author")
-            author_head.string = document["author"]
-            author_head.attrs["href"] = author_path[l['code']]
- 
-            title = soup.find(id="title")
-            title.string = l["archive"]
-            body = soup.find(id="body")
-            ul = soup.new_tag("ul", id="articles")
-
-            for a in l['articles']:
-                article = dict_from_file(a)
-                a = a.split("/")[-1]
-                if l["ISO/IEC 15897"] in article.keys():
-                    url = join(self.config['domain'], l['code'], "articles", a + ".html")
-                    article_tag = soup.new_tag("a", attrs={"href":url})
-                    article_tag.append(article[l["ISO/IEC 15897"]]["title"])
-                    li = soup.new_tag("li")
-                    li.append(article_tag)
-                    ul.append(li)
-            body.append(ul)
-
-            locales_tag = soup.find(id="locales")
-            for m in self.locales:
-                if m == l:
-                    locales_content = "[" + m["code"] + "]"
-                    locales_tag.append(locales_content)
-                else:
-                    locale_tag = soup.new_tag("a", attrs={"href":archive_path[m["code"]]})
-                    locale_tag.append(m["code"])
-                    locales_tag.append("[")
-                    locales_tag.append(locale_tag)
-                    locales_tag.append("]")
+        Args:
+            kind (str): the taxonomy, "tags" or "categories"
+            code (str): code of the locale of the page
+            term (str): the term listed by the page, None for the index of
+                the terms
+        """
+        l = [loc for loc in self.locales if loc['code'] == code][0]
+        locale = l["ISO/IEC 15897"]
+        domain = self.config['domain']
+        page = self.taxonomy_page(kind, term)
+        paths = {m['code']:join(domain, m['code'], page) for m in self.taxonomy_locales(kind, term)}
+        locales = [m for m in self.locales if m['code'] in paths]
+
+        template = self.template("archive.html")
+
+        items = []
+        if term == None:
+            for t in self.index.terms(locale, kind):
+                url = join(domain, code, self.taxonomy_page(kind, t))
+                items.append(element("li", html=element("a", t, href=url) + " ({})".format(len(self.index.members(locale, kind, t)))))
+            title = l[kind]
+            body = element("ul", html="".join(items), id=kind, class_=kind)
+        else:
+            for article in self.taxonomy_articles(l, kind, term):
+                url = join(domain, code, "articles", article.name + ".html")
+                items.append(element("li", html=element("a", article.titles[locale], href=url)))
+            title = term
+            body = element("ul", html="".join(items), id="articles")
+
+        slots = {"html":{"attrs":{"lang":code}},
+                 "head":{"attrs":{"lang":code}, "append":element("title", title if term == None else l[kind] + ": " + term)},
+                 "author":{"text":l[kind], "attrs":{"href":join(domain, code, self.taxonomy_page(kind))}},
+                 "title":{"text":title},
+                 "body":{"append":body},
+                 "locales":{"append":self.locale_switcher(l, locales, paths)},
+                 "license":{"append":self.license(l)}}
+
+        makedirs(join(self.build_path, code, kind), exist_ok=True)
+        self.save(template.render(slots), join(self.build_path, code, page))
+
+    def feed_articles(self, l, record=None):
+        """Entries of a feed: the most recently edited articles in a locale
 
-            license_tag = soup.find(id="license")
-            license_soup = BeautifulSoup(l[self.config["license"]], 'html.parser')
-            license_tag.append(license_soup)
+        Args:
+            l (dict): locale of the feed
+            record (Author): record of the author of the feed, None for the
+                feed of the whole website
+        Returns:
+            (list) at most "feed-size" (20 by default) Article records
+        """
+        author = record.author if record != None else None
+        return self.index.select(l["ISO/IEC 15897"], author=author)[:self.config.get("feed-size", 20)]
 
-            self.sitemap.add_url(archive_path[l['code']], getlastedit(author, sitemap=True), locales=archive_path, changefreq='monthly', priority='0.5')
+    def feed_page(self, record, kind):
+        """Path of a feed relative to the locale directory
 
-            save(str(soup), join(self.build_path, l['code'], "archive", author_name + ".html")) 
+        Args:
+            record (Author): record of the author of the feed, None for the
+                feed of the whole website
+            kind (str): format of the feed, "atom", "rss" or "json"
+        Returns:
+            (str) i.e. feeds/atom.xml or feeds/authors/you/atom.xml
+        """
+        if record == None:
+            return join("feeds", feed_files[kind])
+        return join("feeds", "authors", record.name, feed_files[kind])
+
+    def build_feeds(self, author=None):
+        """Plan the feeds of the website, or of an author, in every locale
+
+        A feed is planned in every format listed in "feeds" in the config and
+        in every locale with articles; its entries are taken from the index,
+        so article files are not read. A feed depends on the set of its
+        entries and their last edit (and on the name of its author), so it
+        is rendered again only when they change.
+
+        Args:
+            author (str): path of the author file, None for the feeds of the
+                whole website
+        Note:
+            Produces {/language_code/}feeds/atom.xml, rss.xml and feed.json
+            and {/language_code/}feeds/authors/author/atom.xml...
+        """
+        record = self.index.by_path[author] if author != None else None
+        for l in self.locales:
+            articles = self.feed_articles(l, record)
+            if articles == []:
+                continue
+            for kind in self.config["feeds"]:
+                page = join(l['code'], self.feed_page(record, kind))
+                deps = self.dependencies(l, None)
+                deps["feed"] = " ".join("{}@{}".format(a.path, a.mtime) for a in articles)
+                if record != None:
+                    deps["feed author"] = record.author
+                if self.outdated(page, deps):
+                    self.schedule(page, ("feed", author, l['code'], kind))
+
+    def render_feed(self, author, code, kind):
+        """Render a feed of the website, or of an author, in a locale
+
+        The feed is written entry by entry by a streaming writer, see
+        alsangue.feeds.
 
-def main():
-    parser = ArgumentParser(description="builds statics websites")
+        Args:
+            author (str): path of the author file, None for the feed of the
+                whole website
+            code (str): code of the locale of the feed
+            kind (str): format of the feed, "atom", "rss" or "json"
+        """
+        l = [loc for loc in self.locales if loc['code'] == code][0]
+        record = self.index.by_path[author] if author != None else None
+        articles = self.feed_articles(l, record)
+        domain = self.config['domain']
+        page = self.feed_page(record, kind)
+
+        feed = {"url":join(domain, code, page), "language":code, "updated":max(a.mtime for a in articles)}
+        if record == None:
+            feed["title"] = self.config.get("title", domain)
+            feed["link"] = join(domain, code, self.config['homepage'] + ".html")
+        else:
+            feed["title"] = record.author
+            feed["link"] = join(domain, code, "authors", record.name + ".html")
+
+        entries = [{"title":a.titles[l["ISO/IEC 15897"]], "url":join(domain, code, "articles", a.name + ".html"),
+                    "author":a.author, "updated":a.mtime, "published":a.date} for a in articles]
+
+        out = BytesIO()
+        feed_writers[kind](out, feed, entries)
+        makedirs(join(self.build_path, code, dirname(page)), exist_ok=True)
+        self.save(out.getvalue(), join(self.build_path, code, page))
+
+    def build_search(self):
+        """Write the search index of every locale
+
+        With "search" set in the config, the articles of every locale are
+        indexed in {/language_code/}search (see alsangue.search.SearchIndex),
+        along with search.js, the script querying it. The index depends on
+        the set of the articles and their last edit; when it changes only
+        the changed articles are read, through the parse cache, and only the
+        shards of their words are written again. In a dry run the index is
+        only planned.
+        """
+        if not self.config.get("search", False):
+            return
+        script = join(dirname(realpath(__file__)), "search.js")
+        for l in self.locales:
+            articles = self.index.select(l["ISO/IEC 15897"])
+            if articles == []:
+                continue
+            directory = join(l['code'], "search")
+            deps = self.dependencies(l, None)
+            deps["search"] = " ".join("{}@{}".format(a.path, a.mtime) for a in articles)
+            written = []
+            if self.outdated(join(directory, "index.json"), deps) and not self.dry_run:
+                with stage("search_index", l['code']):
+                    try:
+                        written = self.render_search(l, articles)
+                    except Exception as e:
+                        self.errors.append((join(directory, "index.json"), describe(e)))
+                        self.failures.append(join(directory, "index.json"))
+                        if self.manifest != None:
+                            self.manifest.recorded.pop(join(directory, "index.json"), None)
+            for f in ls(join(self.build_path, directory)) if isdir(join(self.build_path, directory)) else []:
+                if f.endswith(".json") and f != "index.json" and not compressed(f):
+                    self.graph.add(join(directory, f), {}, ["changed words"] if f in written else [])
+            if self.outdated(join(directory, "search.js"), self.dependencies(l, script)) and not self.dry_run:
+                self.save(load(script), join(self.build_path, directory, "search.js"))
+
+    def render_search(self, l, articles):
+        """Update the search index of a locale
+
+        Args:
+            l (dict): locale of the index
+            articles (list): records of the articles in the locale
+        Returns:
+            (list) names of the written shards
+        """
+        directory = join(self.build_path, l['code'], "search")
+        makedirs(directory, exist_ok=True)
+        index = SearchIndex(join(self.build_path, ".alsangue-search-" + l['code']))
+        names = {a.name for a in articles}
+        for name in [n for n in index.documents if not n in names]:
+            index.remove(name)
+        for a in articles:
+            if index.outdated(a.name, a.mtime):
+                content = dict_from_file(a.path)[l["ISO/IEC 15897"]].get("content", "")
+                url = join(self.config['domain'], l['code'], "articles", a.name + ".html")
+                index.add(a.name, a.mtime, a.titles[l["ISO/IEC 15897"]], url, terms(a.titles[l["ISO/IEC 15897"]], content))
+                count("articles indexed")
+
+        keys = set(index.keys())
+        shards = index.shards(index.changed & keys)
+        written = []
+        for key in sorted(index.changed):
+            if key in keys:
+                written.append(key + ".json")
+                self.save(dumps(shards.pop(key), ensure_ascii=False, separators=(",", ":")), join(directory, key + ".json"))
+            elif exists(join(directory, key + ".json")):
+                rm(join(directory, key + ".json"))
+        self.save(dumps(index.header(), ensure_ascii=False, separators=(",", ":")), join(directory, "index.json"))
+        index.save()
+        return written
+
+_worker = None
+
+def _init_worker(builder):
+    """Store the builder received by a worker process"""
+    global _worker
+    _worker = builder
+    builder.results = []
+    set_cache(builder.cache_path)
+    if builder.profiler != None:
+        builder.profiler = Profiler(memory=builder.profiler.memory)
+    set_profiler(builder.profiler)
+
+def _render(tasks):
+    """Execute a batch of render tasks in a worker process
+
+    Returns:
+        (tuple) records and counters of the worker profiler, if any, the
+        outcome of every task and the fragments used, see Builder.merge
+    """
+    for t in tasks:
+        _worker.render(t)
+        _worker.guard.check()
+    results, _worker.results = _worker.results, []
+    records = _worker.profiler.collect() if _worker.profiler != None else None
+    return records, results, _worker.fragments.collect()
+
+def stamp(content_path, build_path, assets="copy", prune=False, domain=None):
+    """Stamp of a website built incrementally with some options, see alsangue.stamp.Stamp
+
+    Args:
+        content_path (str): path of the content directory
+        build_path (str): path of the build directory
+        assets, prune, domain: as the arguments of Builder
+    Returns:
+        (Stamp) the stamp
+    """
+    inputs = [realpath(content_path), join(Builder.alsangue_path, "locales"), join(Builder.alsangue_path, "search.js")]
+    return Stamp(realpath(build_path), inputs, [version, assets, prune, domain])
+
+def report_stale(builder):
+    """Print the stale outputs found by the last build of a builder"""
+    removed = builder.prune and not builder.dry_run and builder.errors == []
+    for f in builder.stale:
+        print(("removed " if removed else "stale ") + f)
+
+def report_errors(builder):
+    """Print the errors of the last build of a builder
+
+    Returns:
+        (int) number of errors
+    """
+    for f, error in builder.errors:
+        print("error {}: {}".format(f, error), file=sys.stderr)
+    if builder.errors != []:
+        print("{} error{}".format(len(builder.errors), "s" if len(builder.errors) > 1 else ""), file=sys.stderr)
+    return len(builder.errors)
+
+def report_plan(builder, explain=[]):
+    """Print the pages a dry run would render, and why
+
+    Args:
+        builder (Builder): builder of the website, after a dry run
+        explain (list): outputs whose dependencies have to be printed, as
+            urls or paths absolute or relative to the build directory
+    """
+    domain = builder.config['domain'].rstrip("/") + "/"
+    for o in explain:
+        if o.startswith(domain):
+            o = o[len(domain):]
+        elif o.startswith("/"):
+            o = relpath(o, builder.build_path)
+        print(builder.graph.explain(o))
+    if explain == []:
+        for o in builder.graph.dirty():
+            print(o + ": " + ", ".join(builder.graph.reasons[o]))
+        print("{} of {} pages to render".format(len(builder.graph.dirty()), len(builder.graph.outputs)))
+    report_stale(builder)
+
+def watch(builder, verbose=False):
+    """Build the website again whenever its content changes
+
+    Errors raised while building are printed and do not stop watching.
+
+    Args:
+        builder (Builder): builder of the website
+        verbose (bool): print the changed files
+    """
+    watcher = Watcher(builder.content_path)
+    try:
+        while True:
+            changed = watcher.wait()
+            if verbose:
+                print("\n".join(sorted(changed)))
+            start = monotonic()
+            try:
+                builder.rebuild(changed)
+            except Exception as e:
+                print_exc()
+                continue
+            print("rebuilt in {:.3f}s".format(monotonic() - start))
+            report_stale(builder)
+            report_errors(builder)
+            if builder.profiler != None:
+                builder.profiler.report()
+    except KeyboardInterrupt as e:
+        pass
+    finally:
+        watcher.close()
+
+def batch(argv):
+    """Build several websites in one process, see 'alsangue batch --help'
+
+    The builders share a session (locales, templates and fragments); a
+    website failing to build does not stop the others.
+
+    Args:
+        argv (list): command line arguments
+    Returns:
+        (list) BuildResult of every website
+    """
+    parser = ArgumentParser(prog="alsangue batch", description="builds several websites in one process; every website directory has a 'content' directory and is built in its 'build' directory")
+    parser.add_argument("websites", nargs='+', metavar="WEBSITE", help="directory of a website")
+    parser.add_argument("--incremental", dest="incremental", action="store_true", default=False, help="rebuild only pages whose sources, templates, locales or config changed")
+    parser.add_argument("--jobs", "-j", dest="jobs", type=int, default=1, help="number of processes rendering pages; default: 1")
+    parser.add_argument("--threads", dest="threads", type=int, default=0, help="number of threads reading and writing files; default: 0, no threads")
+    parser.add_argument("--assets", dest="assets", choices=modes, default="copy", help="how files in 'res' are placed in the build; default: copy")
+    parser.add_argument("--memory-limit", dest="memory_limit", type=int, default=None, metavar="MB", help="ceiling of the memory of every building process in MiB")
+    parser.add_argument("--resume", dest="resume", action="store_true", default=False, help="continue interrupted incremental builds")
+    parser.add_argument("--prune", dest="prune", action="store_true", default=False, help="remove outputs of deleted articles, authors and locales")
+    parser.add_argument("--results", dest="results", default=None, metavar="FILE", help="save the result of every build as a JSON line in FILE")
+    args = parser.parse_args(argv)
+
+    session = Session()
+    memory_limit = args.memory_limit * 2**20 if args.memory_limit != None else None
+    results = []
+    for w in args.websites:
+        content, build = join(w, "content"), join(w, "build")
+        try:
+            builder = Builder(content_path=content, build_path=build, incremental=args.incremental or args.resume, jobs=args.jobs,
+                              assets=args.assets, prune=args.prune, threads=args.threads, memory_limit=memory_limit,
+                              resume=args.resume, session=session, defer=True)
+            result = builder.build()
+        except Exception as e:
+            result = BuildResult(realpath(content), realpath(build), errors=[(w, describe(e))])
+        results.append(result)
+        print("{}: {} of {} pages rendered in {:.3f}s, {} stale, {} errors".format(w, len(result.rendered), result.outputs,
+                                                                               result.seconds, len(result.stale), len(result.errors)))
+        for f, error in result.errors:
+            print("error {}: {}".format(f, error), file=sys.stderr)
+    if args.results != None:
+        with open(args.results, 'w') as f:
+            for r in results:
+                f.write(dumps(r.as_dict()) + "\n")
+    return results
+
+def check(argv):
+    """Check the links of a built website, see 'alsangue check --help'
+
+    Args:
+        argv (list): command line arguments
+    Returns:
+        (list) the problems found, see alsangue.links.LinkChecker
+    """
+    parser = ArgumentParser(prog="alsangue check", description="checks that the internal links, the sitemap alternates and the index.html links of a built website lead to its outputs")
+    parser.add_argument("content_directory", nargs='?', default=join(getcwd(), "content"), help="directory of the website structure, whose config gives the domain; default: ./content")
+    parser.add_argument("build_directory", nargs='?', default=join(getcwd(), "build"), help="directory of the built website; default: ./build")
+    parser.add_argument("--domain", dest="domain", default=None, help="url of the website; default: the one in the config")
+    parser.add_argument("--jobs", "-j", dest="jobs", type=int, default=None, help="number of processes scanning pages; default: number of processors")
+    args = parser.parse_args(argv)
+
+    domain = args.domain
+    if domain == None:
+        domain = dict_from_file(join(args.content_directory, "config"))["domain"]
+    checker = LinkChecker(args.build_directory, domain, args.jobs)
+    problems = checker.run()
+    for where, url, reason in problems:
+        print("{}: {}: {}".format(where, url, reason))
+    print("{} pages, {} links, {} sitemap urls checked: {} problems".format(len(checker.pages), checker.links, checker.urls, len(problems)))
+    return problems
+
+def main(argv=None):
+    if argv == None:
+        argv = sys.argv[1:]
+    if argv == ["--version"]:
+        print(version)
+        return
+    from setproctitle import setproctitle
+    setproctitle(name)
+    if argv[:1] == ["batch"]:
+        if not all(r.ok for r in batch(argv[1:])):
+            sys.exit(1)
+        return
+    if argv[:1] == ["check"]:
+        if check(argv[1:]) != []:
+            sys.exit(1)
+        return
+    command = "build"
+    if argv[:1] == ["serve"]:
+        command = "serve"
+        argv = argv[1:]
+
+    parser = ArgumentParser(prog="alsangue", description="builds statics websites; 'alsangue serve' builds, watches and serves the website, 'alsangue batch' builds several websites, 'alsangue check' checks the links of a built website")
     parser.add_argument("content_directory", nargs='?', default=join(getcwd(), "content"), help="directory of the website structure; default: ./content")
     parser.add_argument("build_directory", nargs='?', default=join(getcwd(), "build"), help="where to create 'build' directory; default: ./build")
+    parser.add_argument("--incremental", dest="incremental", action="store_true", default=False, help="rebuild only pages whose sources, templates, locales or config changed")
+    parser.add_argument("--jobs", "-j", dest="jobs", type=int, default=1, help="number of processes rendering pages; default: 1")
+    parser.add_argument("--threads", dest="threads", type=int, default=0, help="number of threads reading and writing files, useful on network file systems; default: 0, no threads")
+    parser.add_argument("--assets", dest="assets", choices=modes, default="copy", help="how files in 'res' are placed in the build; default: copy")
+    parser.add_argument("--watch", dest="watch", action="store_true", default=False, help="keep running and rebuild changed pages when the content changes")
+    parser.add_argument("--host", dest="host", default="localhost", help="address 'alsangue serve' listens on; default: localhost")
+    parser.add_argument("--port", dest="port", type=int, default=8000, help="port 'alsangue serve' listens on; default: 8000")
+    parser.add_argument("--dry-run", dest="dry_run", action="store_true", default=False, help="print the pages an incremental build would render, and why, without building")
+    parser.add_argument("--explain", dest="explain", action="append", default=[], metavar="OUTPUT", help="print the dependencies of an output (path in the build directory or url) and why it would be rendered; implies --dry-run")
+    parser.add_argument("--graph", dest="graph", default=None, metavar="FILE", help="save the dependency graph of the pages, with the urls to purge from caches, as JSON in FILE")
+    parser.add_argument("--memory-limit", dest="memory_limit", type=int, default=None, metavar="MB", help="ceiling of the memory of every building process in MiB; the build stops with an error if it cannot stay below it")
+    parser.add_argument("--resume", dest="resume", action="store_true", default=False, help="continue an interrupted incremental build, keeping the pages it already wrote")
+    parser.add_argument("--prune", dest="prune", action="store_true", default=False, help="remove outputs of deleted articles, authors and locales")
+    parser.add_argument("--profile", dest="profile", nargs='?', const="alsangue-profile.json", default=None, metavar="FILE", help="print time, memory and i/o of every build stage and save them as a Chrome trace in FILE; default: alsangue-profile.json")
     parser.add_argument("--verbose", dest="verbose", action="store_true", default=False, help="extended output")
     parser.add_argument("--version", dest="version", action="store_true", default=False, help="print alsangue version")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     if args.verbose:
         print(args)
         print(args.content_directory)
         print(args.build_directory)
-    if args.version:
-        print(version)
-    else:
-        build = Builder(content_path=args.content_directory, build_path=args.build_directory)
+    profiler = None
+    if args.profile != None:
+        profiler = Profiler(realpath(args.profile))
+    memory_limit = args.memory_limit * 2**20 if args.memory_limit != None else None
+    quick = not (args.dry_run or args.explain != [] or args.watch or args.graph != None or args.resume or profiler != None)
+    try:
+        if args.version:
+            print(version)
+        elif command == "build" and args.incremental and quick and stamp(args.content_directory, args.build_directory, args.assets, args.prune).valid():
+            if args.verbose:
+                print("up to date")
+        elif command == "serve":
+            url = "http://{}:{}".format(args.host, args.port)
+            build = Builder(content_path=args.content_directory, build_path=args.build_directory, incremental=True, jobs=args.jobs, domain=url, assets=args.assets, profiler=profiler, prune=args.prune, threads=args.threads, memory_limit=memory_limit)
+            report_stale(build)
+            report_errors(build)
+            if profiler != None:
+                profiler.report()
+            server = serve(build.build_path, args.host, args.port)
+            print("serving {} on {}".format(build.build_path, url))
+            watch(build, verbose=args.verbose)
+            server.shutdown()
+        else:
+            dry_run = args.dry_run or args.explain != []
+            incremental = args.incremental or args.watch or dry_run or args.graph != None or args.resume
+            build = Builder(content_path=args.content_directory, build_path=args.build_directory, incremental=incremental, jobs=args.jobs, assets=args.assets, profiler=profiler, prune=args.prune, threads=args.threads, dry_run=dry_run, memory_limit=memory_limit, resume=args.resume)
+            if dry_run:
+                report_plan(build, args.explain)
+            else:
+                report_stale(build)
+            errors = report_errors(build)
+            if args.graph != None:
+                build.graph.save(args.graph, build.config['domain'], build.stale)
+            if profiler != None:
+                profiler.report()
+            if args.watch:
+                watch(build, verbose=args.verbose)
+            elif errors > 0:
+                sys.exit(1)
+    except MemoryError as e:
+        print("error {}: {}".format(args.build_directory, describe(e)), file=sys.stderr)
+        sys.exit(1)
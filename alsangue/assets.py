@@ -0,0 +1,203 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from alsangue.profile import count
+from alsangue.utils import commit, hidden
+from fcntl import ioctl
+from hashlib import sha1
+from json import dump, load
+from os import link, makedirs, replace, rmdir, stat, walk
+from os import remove as rm
+from os.path import join, exists, dirname, relpath, splitext
+from re import compile as regex
+from shutil import copy2, copystat
+
+FICLONE = 0x40049409
+
+modes = ["copy", "hardlink", "reflink"]
+
+reference = regex(r"""((?:href|src)\s*=\s*["']?[^"'\s>]*?res/)([^"'\s>?#]+)""")
+
+def digest(f):
+    """Hash of the content of a file, read in chunks
+
+    Args:
+        f (str): path of the file
+    Returns:
+        (str) sha1 hex digest
+    """
+    h = sha1()
+    with open(f, 'rb') as g:
+        for chunk in iter(lambda : g.read(1 << 20), b""):
+            h.update(chunk)
+    count("files read")
+    return h.hexdigest()
+
+def fingerprinted(name, digest):
+    """Insert a content hash in a file name, i.e. style.css -> style.0123abcd.css"""
+    root, extension = splitext(name)
+    return "{}.{}{}".format(root, digest[:8], extension)
+
+def place(source, destination, mode="copy"):
+    """Make a file available at another path
+
+    Hardlinks and reflinks fall back to a copy where the file system
+    does not support them. The destination is replaced atomically.
+
+    Args:
+        source (str): path of the file
+        destination (str): path of the new file
+        mode (str): one of "copy", "hardlink" or "reflink"
+    """
+    makedirs(dirname(destination), exist_ok=True)
+    tmp = join(dirname(destination), "." + destination.split("/")[-1] + ".tmp")
+    if exists(tmp):
+        rm(tmp)
+    try:
+        if mode == "hardlink":
+            link(source, tmp)
+        elif mode == "reflink":
+            with open(source, 'rb') as s, open(tmp, 'wb') as d:
+                ioctl(d.fileno(), FICLONE, s.fileno())
+            copystat(source, tmp)
+        else:
+            copy2(source, tmp)
+    except OSError as e:
+        copy2(source, tmp)
+    replace(tmp, destination)
+    count("assets placed")
+
+class Assets:
+    """Synchronizes the "res" directory of the content with the build directory
+
+    Nested directories are supported. A file is placed again only if its size or
+    modification time changed and its content hash differs from the one of the
+    last build; outputs whose source has been deleted are removed.
+
+    With fingerprinting every output name contains the hash of its content
+    (style.css -> style.0123abcd.css), so that it can be cached forever. The
+    mapping from source to output names is saved as "assets.json" in the output
+    directory; templates referencing "res/<name>" are rewritten with Assets.rewrite.
+
+    The state of the synchronization is kept in the parent of the output directory.
+
+    Args:
+        source (str): path of the "res" directory of the content
+        destination (str): path of the "res" directory of the build
+        mode (str): how files are placed, one of "copy", "hardlink" or "reflink"
+        fingerprint (bool): insert content hashes in the output names
+    """
+    filename = ".alsangue-assets"
+
+    def __init__(self, source, destination, mode="copy", fingerprint=False):
+        self.source = source
+        self.destination = destination
+        self.mode = mode
+        self.fingerprint = fingerprint
+        self.path = join(dirname(destination), self.filename)
+        self.state = {}
+        self.mapping = {}
+        if exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.state = load(f)
+            except ValueError as e:
+                self.state = {}
+
+    def sources(self):
+        """Paths of the non hidden files in the source tree, relative to it"""
+        files = []
+        for root, dirs, names in walk(self.source):
+            dirs[:] = sorted(d for d in dirs if not hidden(d))
+            files += [relpath(join(root, f), self.source) for f in sorted(names) if not hidden(f)]
+        return files
+
+    def sync(self):
+        """Bring the output directory up to date
+
+        Returns:
+            (dict) output names keyed by source names, relative to the directories
+        """
+        state = {}
+        placed = 0
+        for f in self.sources():
+            source = join(self.source, f)
+            st = stat(source)
+            previous = self.state.get(f)
+            if previous != None and previous[0] == st.st_size and previous[1] == st.st_mtime_ns and \
+               previous[3] == (fingerprinted(f, previous[2]) if self.fingerprint else f) and \
+               exists(join(self.destination, previous[3])):
+                state[f] = previous
+                continue
+            h = digest(source)
+            output = fingerprinted(f, h) if self.fingerprint else f
+            if previous == None or previous[2] != h or previous[3] != output or not exists(join(self.destination, output)):
+                place(source, join(self.destination, output), self.mode)
+                placed += 1
+            state[f] = [st.st_size, st.st_mtime_ns, h, output]
+
+        outputs = {s[3] for s in state.values()}
+        for f, s in self.state.items():
+            if not s[3] in outputs and exists(join(self.destination, s[3])):
+                rm(join(self.destination, s[3]))
+                self.prune(dirname(join(self.destination, s[3])))
+
+        self.state = state
+        self.mapping = {f:s[3] for f, s in sorted(state.items())}
+        with open(self.path + ".tmp", 'w') as f:
+            dump(state, f)
+        replace(self.path + ".tmp", self.path)
+        if self.fingerprint:
+            with open(join(self.destination, "assets.json.tmp"), 'w') as f:
+                dump(self.mapping, f, indent=1, sort_keys=True)
+            commit(join(self.destination, "assets.json.tmp"), join(self.destination, "assets.json"))
+        self.placed = placed
+        return self.mapping
+
+    def previous(self):
+        """Output names keyed by source names as of the last synchronization, see Assets.sync"""
+        return {f:s[3] for f, s in sorted(self.state.items())}
+
+    def prune(self, directory):
+        """Remove empty directories left in the output tree"""
+        while directory != self.destination and directory.startswith(self.destination):
+            try:
+                rmdir(directory)
+            except OSError as e:
+                return
+            directory = dirname(directory)
+
+    def rewrite(self, code):
+        """Point the "res/<name>" references of href and src attributes to fingerprinted names
+
+        Args:
+            code (str): html code, usually a template
+        Returns:
+            (str) the rewritten code
+        """
+        if not self.fingerprint:
+            return code
+        def fingerprint(match):
+            name = match.group(2)
+            return match.group(1) + self.mapping.get(name, name)
+        return reference.sub(fingerprint, code)
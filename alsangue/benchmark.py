@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from alsangue import Builder, version
+from alsangue.stamp import Stamp
+from alsangue.utils import dict_from_file, ls, save
+from argparse import ArgumentParser
+from json import dumps, loads
+from os import environ, getcwd, makedirs, utime
+from os.path import join, realpath, dirname, exists
+from platform import python_version
+from random import Random
+from shutil import copy, rmtree
+from subprocess import DEVNULL, run as execute
+from tempfile import mkdtemp
+from time import perf_counter, sleep, strftime
+import sys
+
+alsangue_path = dirname(realpath(__file__))
+
+words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit",
+         "sed", "do", "eiusmod", "tempor", "incididunt", "ut", "labore", "et", "dolore"]
+
+def text(random, size):
+    """Random words, about size characters long"""
+    chunk = []
+    length = 0
+    while length < size:
+        chunk.append(random.choice(words))
+        length += len(chunk[-1]) + 1
+    return " ".join(chunk)
+
+def generate(path, articles=1000, authors=10, locales=2, body=2000, assets=10, asset_size=10000, seed=0):
+    """Generate the content directory of a synthetic website
+
+    Articles and authors are Python dictionaries, as in the example directory;
+    the templates are the ones of the example. Articles are spread over the
+    authors and translated in the first locales found in the "locales"
+    directory; their modification times go back one day per article.
+
+    Args:
+        path (str): content directory, created if missing
+        articles (int): number of articles
+        authors (int): number of authors
+        locales (int): number of locales every article is written in
+        body (int): size in characters of the content of every translation
+        assets (int): number of files in "res"
+        asset_size (int): size in bytes of every file in "res"
+        seed (int): seed of the random contents
+    """
+    random = Random(seed)
+    available = [dict_from_file(join(alsangue_path, "locales", l)) for l in sorted(ls(join(alsangue_path, "locales")))]
+    locales = available[:max(1, locales)]
+
+    for d in ["articles", "authors", "templates", "res"]:
+        makedirs(join(path, d), exist_ok=True)
+    for t in ls(join(alsangue_path, "example", "content", "templates")):
+        copy(join(alsangue_path, "example", "content", "templates", t), join(path, "templates", t))
+
+    config = {"domain":"http://localhost:8000",
+              "homepage":"authors/author0",
+              "locale":locales[0]["ISO/IEC 15897"],
+              "license":"cc-by-nc-nd"}
+    save(repr(config), join(path, "config"))
+
+    names = ["Author {}".format(i) for i in range(authors)]
+    for i, name in enumerate(names):
+        sections = [{l["ISO/IEC 15897"]:{"title":text(random, 20), "content":"<p>{}</p>".format(text(random, 500))} for l in locales}]
+        author = {"author":name, "email":"author{}@localhost".format(i), "sections":sections}
+        save(repr(author), join(path, "authors", "author{}".format(i)))
+
+    now = 1500000000
+    for i in range(articles):
+        article = {"author":names[i % authors], "date":"{}/{:02d}/{:02d}".format(2000 + i // 336 % 30, i // 28 % 12 + 1, i % 28 + 1)}
+        for l in locales:
+            paragraphs = ["<p>{}</p>".format(text(random, 500)) for j in range(max(1, body // 500))]
+            article[l["ISO/IEC 15897"]] = {"title":text(random, 40), "content":"\n".join(paragraphs)}
+        f = join(path, "articles", "article{}".format(i))
+        save(repr(article), f)
+        utime(f, (now - i * 86400, now - i * 86400))
+
+    for i in range(assets):
+        save(bytes(random.getrandbits(8) for j in range(asset_size)), join(path, "res", "asset{}.bin".format(i)))
+
+def edit(path, article=0):
+    """Edit the content of an article of a generated website"""
+    f = join(path, "articles", "article{}".format(article))
+    document = dict_from_file(f)
+    for k, v in document.items():
+        if type(v) == dict:
+            v["content"] += "\n<p>edited</p>"
+    save(repr(document), f)
+
+def timed(f, *args, **kwargs):
+    """Seconds taken by a function call"""
+    start = perf_counter()
+    f(*args, **kwargs)
+    return perf_counter() - start
+
+def startup(content, build, repeat=3):
+    """Time the command line printing its version and finding a website up to date
+
+    Every run is a new interpreter, so that the imports are timed too; the
+    website is built once more, after the last changes of its content are old
+    enough to be stamped (see alsangue.stamp.Stamp).
+
+    Args:
+        content (str): content directory of a website
+        build (str): build directory of the website
+        repeat (int): runs of every scenario
+    Returns:
+        (dict) seconds taken by the "version" and "up-to-date" commands
+    """
+    sleep(Stamp.racy / 1e9)
+    Builder(content, build, incremental=True)
+    command = [sys.executable, "-c", "from alsangue import main; main()"]
+    env = dict(environ, PYTHONPATH=dirname(alsangue_path))
+    scenarios = {"version":command + ["--version"], "up-to-date":command + [content, build, "--incremental"]}
+    return {k:min(timed(execute, c, env=env, stdout=DEVNULL, check=True) for i in range(repeat)) for k, c in scenarios.items()}
+
+def run(parameters, jobs=1, repeat=3, directory=None):
+    """Time cold, no-op and single article edit builds of a synthetic website
+
+    Every scenario is run repeat times and the best time is kept; the startup
+    of the command line is timed as well, see startup.
+
+    Args:
+        parameters (dict): arguments of generate
+        jobs (int): number of rendering processes
+        repeat (int): runs of every scenario
+        directory (str): where the website is generated; a temporary
+            directory, removed afterwards, if None
+    Returns:
+        (dict) seconds taken by the "cold", "no-op" and "edit" builds and
+        by the "version" and "up-to-date" commands
+    """
+    root = mkdtemp(prefix="alsangue-benchmark-") if directory == None else directory
+    content, build = join(root, "content"), join(root, "build")
+    try:
+        generate(content, **parameters)
+        results = {"cold":[], "no-op":[], "edit":[]}
+        for i in range(repeat):
+            if exists(build):
+                rmtree(build)
+            results["cold"].append(timed(Builder, content, build, incremental=True, jobs=jobs))
+            results["no-op"].append(timed(Builder, content, build, incremental=True, jobs=jobs))
+            edit(content, i)
+            results["edit"].append(timed(Builder, content, build, incremental=True, jobs=jobs))
+        results = {k:min(v) for k, v in results.items()}
+        results.update(startup(content, build, repeat))
+        return results
+    finally:
+        if directory == None:
+            rmtree(root)
+
+def previous(path, parameters):
+    """Last recorded results obtained with the same parameters, or None"""
+    if not exists(path):
+        return None
+    last = None
+    with open(path, 'r') as f:
+        for line in f:
+            record = loads(line)
+            if record["parameters"] == parameters:
+                last = record
+    return last
+
+def main(argv=None):
+    parser = ArgumentParser(prog="alsangue.benchmark", description="times builds of a synthetic website and records the results")
+    parser.add_argument("--articles", type=int, default=1000, help="number of articles; default: 1000")
+    parser.add_argument("--authors", type=int, default=10, help="number of authors; default: 10")
+    parser.add_argument("--locales", type=int, default=2, help="number of locales of every article; default: 2")
+    parser.add_argument("--body", type=int, default=2000, help="characters in the body of every article; default: 2000")
+    parser.add_argument("--assets", type=int, default=10, help="number of files in 'res'; default: 10")
+    parser.add_argument("--asset-size", dest="asset_size", type=int, default=10000, help="bytes of every file in 'res'; default: 10000")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="number of processes rendering pages; default: 1")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every scenario, the best one is kept; default: 3")
+    parser.add_argument("--directory", default=None, help="where to generate the website; default: a temporary directory")
+    parser.add_argument("--results", default=join(getcwd(), "alsangue-benchmarks.jsonl"), help="file the results are appended to; default: ./alsangue-benchmarks.jsonl")
+    args = parser.parse_args(argv)
+
+    parameters = {"articles":args.articles, "authors":args.authors, "locales":args.locales, "body":args.body,
+                  "assets":args.assets, "asset_size":args.asset_size, "jobs":args.jobs}
+    generation = {k:v for k, v in parameters.items() if k != "jobs"}
+    results = run(generation, jobs=args.jobs, repeat=args.repeat, directory=args.directory)
+
+    last = previous(args.results, parameters)
+    for scenario, seconds in results.items():
+        line = "{:<10} {:>10.3f} s".format(scenario, seconds)
+        if last != None and scenario in last["results"]:
+            line += "   {:+.1%} from {}".format(seconds / last["results"][scenario] - 1, last["version"])
+        print(line)
+
+    record = {"version":version, "python":python_version(), "date":strftime("%Y-%m-%d %H:%M:%S"),
+              "parameters":parameters, "results":results}
+    with open(args.results, 'a') as f:
+        f.write(dumps(record) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from alsangue.profile import count
+from alsangue.utils import hidden, save
+from concurrent.futures import ThreadPoolExecutor
+from gzip import compress as gzip
+from hashlib import sha1
+from json import dump, load
+from os import cpu_count, replace, stat, walk
+from os import remove as rm
+from os.path import join, exists, splitext
+
+text_extensions = [".html", ".htm", ".css", ".js", ".json", ".svg", ".xml", ".txt"]
+
+suffixes = [".gz", ".br"]
+
+def brotli():
+    """The brotli module, or None if it is not installed"""
+    try:
+        import brotli
+    except ImportError as e:
+        return None
+    return brotli
+
+def compressed(f):
+    """Tell if a file is a precompressed sibling of another one"""
+    return splitext(f)[1] in suffixes
+
+def text_files(path):
+    """Text files in a directory tree which are worth precompressing
+
+    Args:
+        path (str): the directory
+    Returns:
+        (list) paths of the files
+    """
+    files = []
+    for root, dirs, names in walk(path):
+        dirs[:] = sorted(d for d in dirs if not hidden(d))
+        files += [join(root, f) for f in sorted(names) if not hidden(f) and splitext(f)[1] in text_extensions]
+    return files
+
+class Precompressor:
+    """Writes precompressed .gz (and .br, with the brotli module) siblings of files
+
+    A file is compressed again only if its content hash changed since the last
+    run; siblings of files no longer compressed are removed. The state of the
+    last run is kept in the build directory.
+
+    Args:
+        build_path (str): path of the build directory
+        threads (int): number of compressing threads; zlib and brotli
+            release the interpreter lock, so they run in parallel
+    """
+    filename = ".alsangue-compressed"
+
+    def __init__(self, build_path, threads=None):
+        self.build_path = build_path
+        self.path = join(build_path, self.filename)
+        self.threads = threads if threads != None else cpu_count() or 1
+        self.formats = [".gz"]
+        if brotli() != None:
+            self.formats.append(".br")
+        self.state = {}
+        if exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.state = load(f)
+            except ValueError as e:
+                self.state = {}
+
+    def siblings(self, f):
+        """Paths of the precompressed siblings of a file"""
+        return [f + s for s in self.formats]
+
+    def compress(self, f):
+        """Compress a file if needed
+
+        Args:
+            f (str): path of the file
+        Returns:
+            (list) size, modification time and hash of the file
+        """
+        st = stat(f)
+        previous = self.state.get(f)
+        up_to_date = lambda : all(exists(s) for s in self.siblings(f))
+        if previous != None and previous[:2] == [st.st_size, st.st_mtime_ns] and up_to_date():
+            return previous
+        with open(f, 'rb') as g:
+            data = g.read()
+        digest = sha1(data).hexdigest()
+        if previous == None or previous[2] != digest or not up_to_date():
+            save(gzip(data, compresslevel=9, mtime=0), f + ".gz")
+            if ".br" in self.formats:
+                save(brotli().compress(data), f + ".br")
+            count("files compressed")
+        return [st.st_size, st.st_mtime_ns, digest]
+
+    def run(self, files):
+        """Bring the precompressed siblings of some files up to date
+
+        Args:
+            files (list): paths of the files
+        """
+        files = [f for f in files if exists(f)]
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            state = dict(zip(files, pool.map(self.compress, files)))
+
+        for f in self.state:
+            if not f in state:
+                for s in suffixes:
+                    if exists(f + s):
+                        rm(f + s)
+        self.state = state
+        with open(self.path + ".tmp", 'w') as f:
+            dump(state, f)
+        replace(self.path + ".tmp", self.path)
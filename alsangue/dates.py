@@ -0,0 +1,84 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from datetime import date as calendar_date
+from re import compile as regex
+
+english = {"months":["January", "February", "March", "April", "May", "June", "July",
+                     "August", "September", "October", "November", "December"],
+           "days":["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]}
+
+directive = regex(r"%[dmYyBbAa%]")
+
+cache = {}
+cache_size = 4096
+
+def names(l):
+    """Month and day names of a locale
+
+    Names are taken from the "months" and "days" keys of the locale file;
+    English names are used for the missing ones.
+
+    Args:
+        l (dict): locale, or None for English
+    Returns:
+        (tuple) list of the month names from January and list of the
+        day names from Monday
+    """
+    if l == None:
+        return english["months"], english["days"]
+    return l.get("months", english["months"]), l.get("days", english["days"])
+
+def format_date(date, l=None, format="%d %B %Y"):
+    """Format a date with the names of a locale
+
+    Unlike time.strftime, the process locale is neither used nor changed,
+    so dates in different locales can be formatted at the same time from
+    several threads. Results are cached per date, locale and format; the
+    cache is emptied when it holds cache_size dates, so that its memory
+    does not grow with the number of articles.
+
+    Supported directives: %d, %m, %Y, %y, %B, %b, %A, %a and %%.
+
+    Args:
+        date (tuple): year, month and day
+        l (dict): locale, or None for English
+        format (str): format of the date
+    Returns:
+        (str) the formatted date, i.e. 26 August 2018
+    """
+    key = (tuple(date[:3]), l["ISO/IEC 15897"] if l != None else None, format)
+    text = cache.get(key)
+    if text != None:
+        return text
+    year, month, day = key[0]
+    months, days = names(l)
+    weekday = calendar_date(year, month, day).weekday()
+    values = {"%d":"{:02d}".format(day), "%m":"{:02d}".format(month), "%Y":str(year),
+              "%y":"{:02d}".format(year % 100), "%B":months[month - 1], "%b":months[month - 1][:3],
+              "%A":days[weekday], "%a":days[weekday][:3], "%%":"%"}
+    text = directive.sub(lambda match : values[match.group(0)], format)
+    if len(cache) >= cache_size:
+        cache.clear()
+    cache[key] = text
+    return text
@@ -0,0 +1,130 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+
+from alsangue.utils import xml_escape as escape, xml_quoteattr as quoteattr
+from datetime import date as calendar_date
+from json import dumps
+from time import gmtime, strftime
+
+files = {"atom":"atom.xml", "rss":"rss.xml", "json":"feed.json"}
+
+def rfc3339(epoch):
+    """Date and time of an epoch as in Atom and JSON Feed, i.e. 2018-08-26T10:00:00Z"""
+    return strftime("%Y-%m-%dT%H:%M:%SZ", gmtime(epoch))
+
+weekdays = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+def rfc822(epoch):
+    """Date and time of an epoch as in RSS, i.e. Sun, 26 Aug 2018 10:00:00 GMT
+
+    The names are the English ones whatever the locale, as with
+    email.utils.formatdate, which is not imported because of its cost.
+    """
+    t = gmtime(epoch)
+    return "{}, {:02d} {} {:04d} {:02d}:{:02d}:{:02d} GMT".format(weekdays[t.tm_wday], t.tm_mday, months[t.tm_mon - 1],
+                                                                 t.tm_year, t.tm_hour, t.tm_min, t.tm_sec)
+
+def published_epoch(entry):
+    """Publication date of an entry (YYYY/MM/DD) as the epoch of its midnight in UTC, None if unknown"""
+    if entry["published"] == None:
+        return None
+    year, month, day = [int(n) for n in entry["published"].split("/")]
+    return (calendar_date(year, month, day).toordinal() - calendar_date(1970, 1, 1).toordinal()) * 86400
+
+def published(entry):
+    """Publication date of an entry (YYYY/MM/DD) in RFC 3339, None if unknown"""
+    if entry["published"] == None:
+        return None
+    return rfc3339(published_epoch(entry))
+
+def element(tag, text, **attrs):
+    """Xml element with escaped text and attributes"""
+    start = "".join(" {}={}".format(k, quoteattr(v)) for k, v in attrs.items())
+    return "<{}{}>{}</{}>".format(tag, start, escape(text), tag)
+
+def write_atom(out, feed, entries):
+    """Write an Atom feed
+
+    Args:
+        out: binary file the feed is written to, entry by entry
+        feed (dict): "title", "link" (url of the page of the feed), "url"
+            (url of the feed), "language" and "updated" (epoch) of the feed
+        entries (list): dictionaries with "title", "url", "author",
+            "updated" (epoch) and "published" (YYYY/MM/DD or None)
+    """
+    write = lambda code : out.write(code.encode('utf-8'))
+    write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    write('<feed xmlns="http://www.w3.org/2005/Atom" xml:lang={}>\n'.format(quoteattr(feed["language"])))
+    write(element("title", feed["title"]) + "\n")
+    write('<link href={} rel="self"/>\n'.format(quoteattr(feed["url"])))
+    write('<link href={}/>\n'.format(quoteattr(feed["link"])))
+    write(element("id", feed["url"]) + "\n")
+    write(element("updated", rfc3339(feed["updated"])) + "\n")
+    for e in entries:
+        entry = ["<entry>", element("title", e["title"]), '<link href={}/>'.format(quoteattr(e["url"])),
+                 element("id", e["url"]), element("updated", rfc3339(e["updated"]))]
+        if published(e) != None:
+            entry.append(element("published", published(e)))
+        entry += ["<author>", element("name", e["author"]), "</author>", "</entry>\n"]
+        write("".join(entry))
+    write("</feed>\n")
+
+def write_rss(out, feed, entries):
+    """Write an RSS 2.0 feed, see write_atom
+
+    The pubDate of an entry is its publication date, or its last edit when
+    it has none.
+    """
+    write = lambda code : out.write(code.encode('utf-8'))
+    write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    write('<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom" xmlns:dc="http://purl.org/dc/elements/1.1/">\n<channel>\n')
+    write(element("title", feed["title"]) + "\n")
+    write(element("link", feed["link"]) + "\n")
+    write(element("description", feed["title"]) + "\n")
+    write(element("language", feed["language"]) + "\n")
+    write(element("lastBuildDate", rfc822(feed["updated"])) + "\n")
+    write('<atom:link href={} rel="self" type="application/rss+xml"/>\n'.format(quoteattr(feed["url"])))
+    for e in entries:
+        write("".join(["<item>", element("title", e["title"]), element("link", e["url"]),
+                       element("guid", e["url"], isPermaLink="true"),
+                       element("pubDate", rfc822(published_epoch(e) if e["published"] != None else e["updated"])),
+                       element("dc:creator", e["author"]), "</item>\n"]))
+    write("</channel>\n</rss>\n")
+
+def write_json(out, feed, entries):
+    """Write a JSON Feed (version 1.1), see write_atom"""
+    write = lambda code : out.write(code.encode('utf-8'))
+    head = {"version":"https://jsonfeed.org/version/1.1", "title":feed["title"], "home_page_url":feed["link"],
+            "feed_url":feed["url"], "language":feed["language"]}
+    write(dumps(head, ensure_ascii=False)[:-1] + ', "items": [\n')
+    for i, e in enumerate(entries):
+        item = {"id":e["url"], "url":e["url"], "title":e["title"], "date_modified":rfc3339(e["updated"]),
+                "authors":[{"name":e["author"]}]}
+        if published(e) != None:
+            item["date_published"] = published(e)
+        write((",\n" if i > 0 else "") + dumps(item, ensure_ascii=False))
+    write("\n]}\n")
+
+writers = {"atom":write_atom, "rss":write_rss, "json":write_json}
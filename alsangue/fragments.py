@@ -0,0 +1,106 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+
+from alsangue.profile import count
+from json import dumps, load
+from os import replace
+from os.path import join, exists
+
+class FragmentCache:
+    """Html snippets repeated across pages, rendered once
+
+    A fragment (i.e. the license notice of a locale) is identified by its
+    kind, the code of its locale and the inputs it is rendered from, so a
+    change of the inputs gives a new fragment. With a path, the fragments
+    used by a build are saved in the build directory and reused by the next
+    one, and the others are dropped. Worker processes send the fragments
+    they use back to the main process, see FragmentCache.collect.
+
+    Args:
+        path (str): build directory, None not to keep fragments across builds
+        fragments (dict): rendered fragments, shared with other caches (see
+            alsangue.session.Session)
+    """
+    filename = ".alsangue-fragments"
+
+    def __init__(self, path=None, fragments=None):
+        self.path = join(path, self.filename) if path != None else None
+        self.fragments = fragments if fragments != None else {}
+        self.saved = {}
+        self.used = set()
+        if self.path != None and exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.saved = load(f)
+            except ValueError as e:
+                self.saved = {}
+
+    def get(self, kind, locale, inputs, render):
+        """Return a fragment, rendering it if it is not cached
+
+        Args:
+            kind (str): kind of the fragment, i.e. "license"
+            locale (str): code of the locale of the fragment
+            inputs: what the fragment is rendered from, JSON serializable
+            render (callable): renders the fragment, without arguments
+        Returns:
+            (str) html code of the fragment
+        """
+        key = dumps([kind, locale, inputs])
+        self.used.add(key)
+        if key in self.fragments:
+            return self.fragments[key]
+        if key in self.saved:
+            count("fragment cache hits")
+            self.fragments[key] = self.saved[key]
+        else:
+            count("fragments rendered")
+            self.fragments[key] = render()
+        return self.fragments[key]
+
+    def collect(self):
+        """Take the fragments used since the last call, see FragmentCache.merge
+
+        Returns:
+            (dict) the fragments keyed by their key
+        """
+        used = {k:self.fragments[k] for k in self.used}
+        self.used = set()
+        return used
+
+    def merge(self, fragments):
+        """Add fragments used by another process, so that they are saved"""
+        self.fragments.update(fragments)
+        self.used.update(fragments)
+
+    def save(self):
+        """Keep the fragments used since the last save for the next build"""
+        used = {k:self.fragments[k] for k in sorted(self.used)}
+        self.used = set()
+        if self.path == None or used == self.saved:
+            return
+        with open(self.path + ".tmp", 'w') as f:
+            f.write(dumps(used))
+        replace(self.path + ".tmp", self.path)
+        self.saved = used
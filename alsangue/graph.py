@@ -0,0 +1,102 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from json import dump
+from os import replace
+from os.path import join
+
+
+class DependencyGraph:
+    """Outputs of a build, the inputs they depend on and the reasons to rebuild them
+
+    Nodes are the outputs (paths relative to the build directory) and their
+    dependencies, usually input files or names like "locales" or "showcase"
+    (see Builder.dependencies); an output is dirty when it has reasons to be
+    rendered again.
+    """
+    def __init__(self):
+        self.outputs = {}
+        self.reasons = {}
+        self.inputs = {}
+
+    def add(self, output, deps, reasons):
+        """Add an output
+
+        Args:
+            output (str): path of the output relative to the build directory
+            deps (dict): dependencies of the output mapped to their signatures
+            reasons (list): why the output has to be rendered again, empty if it is up to date
+        """
+        self.outputs[output] = deps
+        self.reasons[output] = reasons
+        for d in deps:
+            self.inputs.setdefault(d, []).append(output)
+
+    def dirty(self, output=None):
+        """Tell if an output is dirty, or list the dirty outputs if output is None"""
+        if output != None:
+            return self.reasons.get(output, []) != []
+        return [o for o in self.outputs if self.reasons[o] != []]
+
+    def dependents(self, input):
+        """Outputs depending on an input"""
+        return self.inputs.get(input, [])
+
+    def explain(self, output):
+        """Describe the dependencies of an output and why it would be rendered
+
+        Args:
+            output (str): path of the output relative to the build directory
+        Returns:
+            (str) the description
+        """
+        if not output in self.outputs:
+            return "{}: not an output of this website".format(output)
+        lines = [output + ": " + ("rebuild (" + ", ".join(self.reasons[output]) + ")" if self.dirty(output) else "up to date")]
+        if self.outputs[output] != {}:
+            lines.append("  depends on:")
+            lines += ["    " + d for d in sorted(self.outputs[output])]
+        return "\n".join(lines)
+
+    def save(self, path, domain="", stale=[]):
+        """Write the graph as JSON
+
+        Besides the outputs, with their url, dependencies and reasons, the file
+        lists for every input the outputs depending on it and the urls which
+        changed (dirty and stale outputs), i.e. the ones to purge from a CDN.
+
+        Args:
+            path (str): path of the file
+            domain (str): url of the website
+            stale (list): outputs of previous builds which are no longer produced
+        """
+        url = lambda o : join(domain, o) if domain else o
+        graph = {"domain":domain,
+                 "outputs":{o:{"url":url(o), "dirty":self.dirty(o), "reasons":self.reasons[o],
+                               "dependencies":sorted(d)} for o, d in sorted(self.outputs.items())},
+                 "inputs":{i:sorted(o) for i, o in sorted(self.inputs.items())},
+                 "stale":[url(o) for o in stale],
+                 "purge":sorted(url(o) for o in self.dirty()) + [url(o) for o in stale]}
+        with open(path + ".tmp", 'w') as f:
+            dump(graph, f, indent=1)
+        replace(path + ".tmp", path)
@@ -0,0 +1,268 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from alsangue.loaders import name_of
+from alsangue.pipeline import prefetch
+from alsangue.utils import dict_from_file
+from os.path import getmtime
+from re import compile as regex
+from sys import intern
+
+taxonomies = ["tags", "categories"]
+
+separator = regex(r"[^\w]+")
+
+def taxonomy_terms(document, kind):
+    """Terms of a taxonomy listed in a document
+
+    The terms are a list of strings, or a string of comma separated terms
+    (handy in front matters).
+
+    Args:
+        document (dict): content of an article file
+        kind (str): the taxonomy, "tags" or "categories"
+    Returns:
+        (tuple) the terms, interned, sorted and without duplicates
+    """
+    terms = document.get(kind, [])
+    if type(terms) == str:
+        terms = terms.split(",")
+    if type(terms) not in [list, tuple] or not all(type(t) == str for t in terms):
+        raise TypeError("'{}' must be a list of strings".format(kind))
+    return tuple(sorted({intern(t.strip()) for t in terms if t.strip() != ""}))
+
+def slugs(terms):
+    """File names of the pages of some terms
+
+    A name is made of the lowercase words of the term joined by dashes;
+    terms giving the same name (or "index") are numbered in alphabetical
+    order.
+
+    Args:
+        terms (iterable): the terms
+    Returns:
+        (dict) the names keyed by term
+    """
+    names = {}
+    used = {"index"}
+    for t in sorted(terms):
+        base = separator.sub("-", t.lower()).strip("-") or "term"
+        name, n = base, 1
+        while name in used:
+            n += 1
+            name = "{}-{}".format(base, n)
+        used.add(name)
+        names[t] = name
+    return names
+
+
+class Article:
+    """Metadata of an article file
+
+    Args:
+        path (str): path of the article file
+        document (dict): content of the article file
+        mtime (float): last modification time of the file, read if None
+    Attributes:
+        name (str): name of the article file, without loader extension
+        author (str): name of the author
+        date (str): publication date (YYYY/MM/DD) or None
+        mtime (float): last modification time of the file
+        titles (dict): title of the article for every locale
+            (ISO/IEC 15897 string) it is written in
+        tags (tuple): tags of the article, see taxonomy_terms
+        categories (tuple): categories of the article
+    """
+    __slots__ = ("path", "name", "author", "date", "mtime", "titles", "tags", "categories")
+
+    def __init__(self, path, document, mtime=None):
+        self.path = path
+        self.name = name_of(path)
+        self.author = document["author"]
+        self.date = document.get("date")
+        self.mtime = mtime if mtime != None else getmtime(path)
+        self.titles = {intern(k):v["title"] for k, v in document.items() if type(v) == dict and "title" in v}
+        self.tags = taxonomy_terms(document, "tags")
+        self.categories = taxonomy_terms(document, "categories")
+
+    def __repr__(self):
+        return "Article({})".format(self.name)
+
+class Author:
+    """Metadata of an author file
+
+    Args:
+        path (str): path of the author file
+        document (dict): content of the author file
+        mtime (float): last modification time of the file, read if None
+    Attributes:
+        name (str): name of the author file, without loader extension
+        author (str): name of the author
+        mtime (float): last modification time of the file
+    """
+    __slots__ = ("path", "name", "author", "mtime")
+
+    def __init__(self, path, document, mtime=None):
+        self.path = path
+        self.name = name_of(path)
+        self.author = document["author"]
+        self.mtime = mtime if mtime != None else getmtime(path)
+
+    def __repr__(self):
+        return "Author({})".format(self.name)
+
+def describe(error):
+    """One line description of an error, i.e. "KeyError: 'author'" """
+    return "{}: {}".format(type(error).__name__, error)
+
+def read(f):
+    """Read a content file, returning the error instead of raising it
+
+    Returns:
+        (tuple) the document, or None, and the error, or None
+    """
+    try:
+        return dict_from_file(f), None
+    except Exception as e:
+        return None, e
+
+class ContentIndex:
+    """In-memory index of the articles and the authors of a website
+
+    Every article and author file is read once; page builders query the
+    index instead of the disk. In a single pass over the articles an
+    inverted index is made, listing the articles of every locale, and of
+    every author, tag and category in a locale, from the last to the
+    oldest edited one.
+
+    Files which cannot be read, or lack required fields, are left out of
+    the index and listed in ContentIndex.errors.
+
+    Args:
+        articles (list): paths of the article files
+        authors (list): paths of the author files
+        threads (int): number of threads reading the files
+    """
+    def __init__(self, articles, authors, threads=0):
+        self.articles = []
+        self.authors = []
+        self.errors = {}
+        self.load(articles, authors, threads)
+
+    def load(self, articles, authors, threads=0):
+        """(Re)load the index
+
+        Records of files which have not been modified since the
+        last load are reused. Files are examined and read by a pool
+        of threads, so that their latencies overlap; every document
+        is dropped as soon as its record is made, so that only the
+        records are held in memory.
+
+        Args:
+            articles (list): paths of the article files
+            authors (list): paths of the author files
+            threads (int): number of threads reading the files
+        """
+        old = {r.path:r for r in self.articles + self.authors}
+        mtimes = dict(prefetch(getmtime, articles + authors, threads))
+        changed = [f for f in articles + authors if not f in old or old[f].mtime != mtimes[f]]
+        kinds = {a:Article for a in articles}
+        self.errors = {}
+        for f, (document, error) in prefetch(read, changed, threads):
+            try:
+                if error != None:
+                    raise error
+                old[f] = kinds.get(f, Author)(f, document, mtimes[f])
+            except Exception as e:
+                old.pop(f, None)
+                self.errors[f] = describe(e)
+
+        self.articles = sorted((old[a] for a in articles if a in old), key=lambda a : a.mtime, reverse=True)
+        self.authors = [old[a] for a in authors if a in old]
+
+        self.by_path = {r.path:r for r in self.articles + self.authors}
+        self.by_author = {}
+        for a in self.authors:
+            self.by_author[a.author] = a
+
+        self.postings = {}
+        self.vocabulary = {}
+        for a in self.articles:
+            for l in a.titles:
+                self.postings.setdefault((l, None, None), []).append(a)
+                self.postings.setdefault((l, "author", a.author), []).append(a)
+                for kind in taxonomies:
+                    for t in getattr(a, kind):
+                        self.postings.setdefault((l, kind, t), []).append(a)
+                        self.vocabulary.setdefault((l, kind), set()).add(t)
+        self.slugs = {kind:slugs({t for (l, k), terms in self.vocabulary.items() if k == kind for t in terms}) for kind in taxonomies}
+
+    def select(self, locale, author=None):
+        """Articles written in a locale, from the last to the oldest edited one
+
+        Args:
+            locale (str): language as an ISO/IEC 15897 string
+            author (str): name of the author (optional)
+        Returns:
+            (list) Article records
+        """
+        if author == None:
+            return self.postings.get((locale, None, None), [])
+        return self.postings.get((locale, "author", author), [])
+
+    def members(self, locale, kind, term):
+        """Articles of a taxonomy term written in a locale, from the last to the oldest edited one
+
+        Args:
+            locale (str): language as an ISO/IEC 15897 string
+            kind (str): the taxonomy, "tags" or "categories"
+            term (str): the term
+        Returns:
+            (list) Article records
+        """
+        return self.postings.get((locale, kind, term), [])
+
+    def terms(self, locale, kind):
+        """Terms of a taxonomy having articles in a locale, sorted
+
+        Args:
+            locale (str): language as an ISO/IEC 15897 string
+            kind (str): the taxonomy, "tags" or "categories"
+        Returns:
+            (list) the terms
+        """
+        return sorted(self.vocabulary.get((locale, kind), []))
+
+    def slug(self, kind, term):
+        """File name, without extension, of the page of a taxonomy term, see slugs"""
+        return self.slugs[kind][term]
+
+    def author_of(self, article):
+        """Author record of an article
+
+        Args:
+            article (Article): record of the article
+        Returns:
+            (Author) record of the author or None if the author has no file
+        """
+        return self.by_author.get(article.author)
@@ -0,0 +1,268 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from alsangue.profile import count
+from alsangue.sitemap import part_name
+from alsangue.utils import hidden
+from gzip import open as gzip_open
+from html import unescape
+from itertools import islice
+from os import cpu_count, walk
+from os.path import join, dirname, exists, islink, normpath, realpath, relpath
+from re import compile as regex, DOTALL
+from urllib.parse import unquote
+
+tag = regex(r"<!--.*?-->|<([a-zA-Z][a-zA-Z0-9]*)\b([^>]*)>", DOTALL)
+link_attribute = regex(r"""\b(?:href|src)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+scheme = regex(r"^[a-zA-Z][a-zA-Z0-9+.-]*:")
+loc = regex(r"<loc>([^<]*)</loc>")
+alternate = regex(r"""<xhtml:link rel="alternate" hreflang=(?:"([^"]*)"|'([^']*)') href=(?:"([^"]*)"|'([^']*)')/>""")
+
+def links(code):
+    """Urls in the href and src attributes of an html page
+
+    The page is scanned by a tokenizer matching start tags and comments
+    only, which is much faster than parsing it.
+
+    Args:
+        code (str): the page
+    Returns:
+        (list) the urls, unescaped
+    """
+    urls = []
+    for match in tag.finditer(code):
+        if match.group(1) != None:
+            for value in link_attribute.finditer(match.group(2)):
+                urls.append(unescape(value.group(value.lastindex)))
+    return urls
+
+class LinkChecker:
+    """Checks the internal links of a built website against its outputs
+
+    The outputs are the non hidden files of the build directory. Every link
+    of every html page (href and src attributes) pointing inside the website,
+    i.e. to the domain or to a relative path, must lead to an output; the
+    pages are scanned by a pool of processes. Every url of the sitemap, and
+    every alternate of a url, must be an output as well; alternates must be
+    in the directory of their locale and name each other, as search engines
+    require. Finally, every symbolic link (the index.html homepages) must
+    resolve to an output and every locale must have its homepage.
+
+    A problem is a tuple (where, url, reason): where is the path of the page
+    or the sitemap file in the build directory, url the offending url or
+    link target.
+
+    Args:
+        build_path (str): path of the build directory
+        domain (str): url of the website
+        jobs (int): number of processes scanning the pages; the number of
+            processors if None
+    """
+    batch_size = 64
+
+    def __init__(self, build_path, domain="", jobs=None):
+        self.build_path = realpath(build_path)
+        self.domain = domain.rstrip("/")
+        self.jobs = jobs if jobs != None else cpu_count() or 1
+        self.outputs = set()
+        self.pages = []
+        self.symlinks = []
+        self.sitemaps = []
+        self.locales = set()
+        self.links = 0
+        self.urls = 0
+        for root, dirs, files in walk(self.build_path):
+            dirs[:] = sorted(d for d in dirs if not hidden(d))
+            for f in sorted(files):
+                if hidden(f):
+                    continue
+                path = relpath(join(root, f), self.build_path)
+                self.outputs.add(path)
+                if islink(join(root, f)):
+                    self.symlinks.append(path)
+                elif f.endswith(".html"):
+                    self.pages.append(path)
+                elif root == self.build_path and (f == "sitemap.xml" or part_name.match(f)):
+                    self.sitemaps.append(path)
+
+    def target(self, url, page=""):
+        """Output a url points to
+
+        Args:
+            url (str): the url
+            page (str): path of the page the url is found in, to resolve relative urls
+        Returns:
+            (str) path of the output in the build directory, None if the url
+            is outside the website, or points to the page itself
+        """
+        url = url.split("#")[0].split("?")[0]
+        if url == "":
+            return None
+        if self.domain != "" and (url == self.domain or url.startswith(self.domain + "/")):
+            path = url[len(self.domain):].lstrip("/")
+        elif scheme.match(url) or url.startswith("//"):
+            return None
+        elif url.startswith("/"):
+            path = url.lstrip("/")
+        else:
+            path = join(dirname(page), url)
+        path = unquote(path)
+        if path == "" or path.endswith("/"):
+            path += "index.html"
+        path = normpath(path)
+        if not path in self.outputs and path + "/index.html" in self.outputs:
+            path += "/index.html"
+        return path
+
+    def broken(self, where, url, page=""):
+        """Problems of a url, an empty list if it leads to an output"""
+        path = self.target(url, page)
+        if path == None or path in self.outputs:
+            return []
+        if path.startswith(".."):
+            return [(where, url, "outside the build directory")]
+        return [(where, url, "no such output " + path)]
+
+    def check_page(self, page):
+        """Problems of the links of an html page"""
+        with open(join(self.build_path, page), 'r', encoding='utf-8', errors='replace') as f:
+            urls = links(f.read())
+        count("files read")
+        problems = []
+        for url in urls:
+            problems += self.broken(page, url, page)
+        return len(urls), problems
+
+    def check_pages(self):
+        """Problems of the links of all the pages, sorted"""
+        problems = []
+        if self.jobs > 1 and len(self.pages) > self.batch_size:
+            from concurrent.futures import ProcessPoolExecutor
+            pages = iter(self.pages)
+            batches = iter(lambda : list(islice(pages, self.batch_size)), [])
+            with ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker, initargs=(self,)) as pool:
+                for links, found in pool.map(_check, batches):
+                    self.links += links
+                    problems += found
+        else:
+            for page in self.pages:
+                links, found = self.check_page(page)
+                self.links += links
+                problems += found
+        return sorted(problems)
+
+    def read_sitemap(self, name):
+        """Entries of a sitemap file
+
+        Sitemap files are written one url per line (see alsangue.sitemap), so
+        they are read line by line.
+
+        Args:
+            name (str): path of the sitemap file in the build directory
+        Returns:
+            (iterator) url and alternate urls keyed by locale code of every entry
+        """
+        opener = gzip_open if name.endswith(".gz") else open
+        with opener(join(self.build_path, name), 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not line.startswith("<url>"):
+                    continue
+                url = unescape(loc.search(line).group(1))
+                alternates = {}
+                for match in alternate.finditer(line):
+                    code = unescape(match.group(1) if match.group(1) != None else match.group(2))
+                    alternates[code] = unescape(match.group(3) if match.group(3) != None else match.group(4))
+                yield url, alternates
+
+    def check_sitemap(self):
+        """Problems of the urls of the sitemap and of their alternates, sorted"""
+        problems = []
+        entries = {}
+        for name in self.sitemaps:
+            for url, alternates in self.read_sitemap(name):
+                self.urls += 1
+                entries[url] = (name, alternates)
+                problems += self.broken(name, url)
+                self.locales.update(alternates)
+                for code, href in alternates.items():
+                    problems += self.broken(name, href)
+                    path = self.target(href)
+                    if path != None and path.split("/")[0] != code:
+                        problems.append((name, href, "alternate {} outside the {} directory".format(code, code)))
+        for url, (name, alternates) in entries.items():
+            if alternates != {} and not url in alternates.values():
+                problems.append((name, url, "not among its own alternates"))
+            for code, href in alternates.items():
+                if href == url:
+                    continue
+                if not href in entries:
+                    problems.append((name, href, "alternate of {} not in the sitemap".format(url)))
+                elif not url in entries[href][1].values():
+                    problems.append((name, href, "alternate of {} not naming it back".format(url)))
+        return sorted(problems)
+
+    def check_symlinks(self):
+        """Problems of the symbolic links and of the homepages, sorted
+
+        The locales having a homepage are the ones found in the sitemap, see
+        LinkChecker.check_sitemap.
+        """
+        problems = []
+        for f in self.symlinks:
+            target = realpath(join(self.build_path, f))
+            path = relpath(target, self.build_path)
+            if path.startswith(".."):
+                problems.append((f, target, "outside the build directory"))
+            elif not exists(target):
+                problems.append((f, target, "no such output " + path))
+        for homepage in ["index.html"] + [join(code, "index.html") for code in sorted(self.locales)]:
+            if not homepage in self.outputs:
+                problems.append((homepage, homepage, "missing homepage"))
+        return sorted(problems)
+
+    def run(self):
+        """Check the website
+
+        Returns:
+            (list) the problems
+        """
+        sitemap = self.check_sitemap()
+        return self.check_pages() + sitemap + self.check_symlinks()
+
+def _init_worker(checker):
+    """Store the checker received by a worker process"""
+    global _checker
+    _checker = checker
+
+def _check(pages):
+    """Check a batch of pages in a worker process
+
+    Returns:
+        (tuple) number of links and problems found
+    """
+    links, problems = 0, []
+    for page in pages:
+        n, found = _checker.check_page(page)
+        links += n
+        problems += found
+    return links, problems
@@ -0,0 +1,205 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from alsangue.profile import count
+from ast import literal_eval
+from hashlib import sha1
+from json import loads
+from marshal import dumps, loads as unmarshal
+from os import getpid, makedirs, replace, stat
+from os.path import join, splitext
+from threading import get_ident
+
+loaders = {}
+
+def loader(*extensions):
+    """Register a content loader for some file extensions
+
+    A loader receives the text of a file and returns a dictionary; files
+    whose extension is not registered are read as Python dictionaries.
+
+    Args:
+        extensions (str): file extensions, i.e. ".json"
+    """
+    def register(f):
+        for e in extensions:
+            loaders[e] = f
+        return f
+    return register
+
+def name_of(f):
+    """Name of a content file without its loader extension
+
+    Args:
+        f (str): path of the file
+    Returns:
+        (str) i.e. "example_page" for ".../articles/example_page.md"
+    """
+    root, extension = splitext(f.split("/")[-1])
+    if extension in loaders:
+        return root
+    return f.split("/")[-1]
+
+def front_matter(text):
+    """Split a document in front matter and body
+
+    The front matter is enclosed between two '---' lines at the beginning
+    of the document and holds 'key: value' lines; values are read as Python
+    literals when possible and as strings otherwise.
+
+    Args:
+        text (str): the document
+    Returns:
+        (tuple) the front matter as a dictionary and the body
+    """
+    meta = {}
+    lines = text.split("\n")
+    if lines[0].strip() != "---":
+        return meta, text
+    for i, line in enumerate(lines[1:], 1):
+        if line.strip() == "---":
+            return meta, "\n".join(lines[i + 1:])
+        if line.strip() == "" or line.lstrip().startswith("#"):
+            continue
+        key, sep, value = line.partition(":")
+        if sep == "":
+            raise ValueError("front matter line without ':': " + line)
+        value = value.strip()
+        try:
+            meta[key.strip()] = literal_eval(value)
+        except (ValueError, SyntaxError) as e:
+            meta[key.strip()] = value
+    raise ValueError("front matter is not terminated by '---'")
+
+def document(meta, body):
+    """Build a content dictionary from front matter and body
+
+    When the front matter has a 'locale' key, title and body become the
+    translation of the document in that locale, as in Python dictionary files:
+    {"author":..., "date":..., locale:{"title":..., "content":body}}.
+
+    Args:
+        meta (dict): front matter
+        body (str): html code of the body
+    Returns:
+        (dict) the content dictionary
+    """
+    if not "locale" in meta:
+        if body.strip() != "":
+            meta["content"] = body
+        return meta
+    locale = meta.pop("locale")
+    meta[locale] = {"title":meta.pop("title", ""), "content":body}
+    return meta
+
+@loader(".json")
+def load_json(text):
+    return loads(text)
+
+@loader(".html", ".htm")
+def load_html(text):
+    return document(*front_matter(text))
+
+@loader(".md", ".markdown")
+def load_markdown(text):
+    try:
+        from markdown import markdown
+    except ImportError as e:
+        raise ImportError("the 'markdown' package is needed to read markdown content")
+    meta, body = front_matter(text)
+    return document(meta, markdown(body))
+
+def load_literal(text):
+    return literal_eval(text)
+
+class ParseCache:
+    """On-disk cache of parsed content files
+
+    Documents are stored with marshal, keyed by the path, modification time
+    and size of the file they have been read from. Every writer uses its own
+    temporary file, so that processes and threads storing the same document
+    do not clash.
+
+    Args:
+        path (str): directory of the cache
+    """
+    format = 1
+
+    def __init__(self, path):
+        self.path = path
+        makedirs(path, exist_ok=True)
+
+    def entry(self, f):
+        return join(self.path, sha1(f.encode('utf-8')).hexdigest())
+
+    def get(self, f, st):
+        """Cached document of a file or None"""
+        try:
+            with open(self.entry(f), 'rb') as g:
+                key, content = unmarshal(g.read())
+        except (OSError, ValueError, EOFError, TypeError) as e:
+            return None
+        if key == (self.format, f, st.st_mtime_ns, st.st_size):
+            return content
+        return None
+
+    def put(self, f, st, content):
+        """Store the document read from a file"""
+        try:
+            data = dumps(((self.format, f, st.st_mtime_ns, st.st_size), content))
+        except ValueError as e:
+            return
+        tmp = "{}.{}.{}.tmp".format(self.entry(f), getpid(), get_ident())
+        with open(tmp, 'wb') as g:
+            g.write(data)
+        replace(tmp, self.entry(f))
+
+cache = None
+
+def set_cache(path):
+    """Cache parsed documents in a directory, or stop caching if path is None"""
+    global cache
+    cache = ParseCache(path) if path != None else None
+
+def read_document(f):
+    """Read a content file with the loader of its extension
+
+    Args:
+        f (str): path of the file
+    Returns:
+        (dict) the document
+    """
+    st = None
+    if cache != None:
+        st = stat(f)
+        content = cache.get(f, st)
+        if content != None:
+            count("parse cache hits")
+            return content
+    with open(f, 'r') as g:
+        text = g.read()
+    count("files read")
+    content = loaders.get(splitext(f)[1], load_literal)(text)
+    if cache != None:
+        cache.put(f, st, content)
+    return content
@@ -0,0 +1,223 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from alsangue.profile import count
+from hashlib import sha1
+from json import dump, dumps, load, loads
+from os import stat, replace
+from os import remove as rm
+from os.path import join, exists
+from threading import Lock
+
+
+class Manifest:
+    """Persistent record of the inputs behind every built page
+
+    Every output is stored, as a path relative to the build directory, together
+    with its dependencies: a dictionary mapping a dependency name (usually the
+    path of an input file) to its signature (usually the hash of its content).
+    An output has to be rebuilt when it is missing or when its dependencies
+    differ from the ones recorded by the previous build.
+
+    File hashes are cached by modification time and size, so that unchanged
+    inputs are not read again; during a build every file is examined once.
+
+    Args:
+        build_path (str): path of the build directory;
+        version (str): alsangue version; a manifest written by another
+            version is discarded, forcing a full rebuild.
+    """
+    filename = ".alsangue-manifest"
+
+    def __init__(self, build_path, version):
+        self.build_path = build_path
+        self.path = join(build_path, self.filename)
+        self.version = version
+        self.files = {}
+        self.outputs = {}
+        self.recorded = {}
+        self.seen = set()
+
+        if exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    manifest = load(f)
+            except ValueError as e:
+                manifest = {}
+            if manifest.get("version") == version:
+                self.files = manifest["files"]
+                self.outputs = manifest["outputs"]
+
+    def fingerprint(self, f):
+        """Return the hash of the content of a file
+
+        Args:
+            f (str): path of the file
+        Returns:
+            (str) sha1 hex digest of the file
+        """
+        if f in self.seen:
+            return self.files[f][2]
+        st = stat(f)
+        self.seen.add(f)
+        cached = self.files.get(f)
+        if cached != None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        with open(f, 'rb') as g:
+            digest = sha1(g.read()).hexdigest()
+        count("files read")
+        self.files[f] = [st.st_mtime_ns, st.st_size, digest]
+        return digest
+
+    def dirty(self, output, deps):
+        """Tell if an output has to be rebuilt
+
+        Args:
+            output (str): path of the output relative to the build directory
+            deps (dict): current dependencies of the output
+        Returns:
+            (bool) True if the output is missing or its dependencies changed
+        """
+        return self.changes(output, deps) != []
+
+    def changes(self, output, deps):
+        """Tell why an output has to be rebuilt
+
+        Args:
+            output (str): path of the output relative to the build directory
+            deps (dict): current dependencies of the output
+        Returns:
+            (list) reasons, i.e. "missing output" or "changed: <dependency>";
+            empty if the output is up to date
+        """
+        if not exists(join(self.build_path, output)):
+            return ["missing output"]
+        previous = self.outputs.get(output)
+        if previous == None:
+            return ["not in the manifest"]
+        reasons = []
+        for d in sorted(set(deps) | set(previous)):
+            if not d in previous:
+                reasons.append("new: " + d)
+            elif not d in deps:
+                reasons.append("removed: " + d)
+            elif deps[d] != previous[d]:
+                reasons.append("changed: " + d)
+        return reasons
+
+    def resume(self, outputs):
+        """Take outputs written by an interrupted build as built, see Journal
+
+        Args:
+            outputs (dict): paths of the outputs mapped to their dependencies
+        """
+        self.outputs.update(outputs)
+
+    def record(self, output, deps):
+        """Record the dependencies an output has been built (or kept) with
+
+        Args:
+            output (str): path of the output relative to the build directory
+            deps (dict): dependencies of the output
+        """
+        self.recorded[output] = deps
+
+    def save(self):
+        """Write the manifest in the build directory
+
+        Only outputs recorded during this build and files fingerprinted
+        during this build are kept.
+        """
+        files = {f:self.files[f] for f in self.seen}
+        manifest = {"version":self.version, "files":files, "outputs":self.recorded}
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w') as f:
+            dump(manifest, f)
+        replace(tmp, self.path)
+        self.outputs = self.recorded
+        self.recorded = {}
+        self.seen = set()
+
+class Journal:
+    """Log of the outputs written by a build which is still running
+
+    Every written output is appended, with its dependencies, as a JSON line
+    flushed at once; the journal is removed when the build completes. If
+    the build is interrupted (an error, a crash, Ctrl-C), the outputs in the
+    journal are up to date and the next build can resume from there, see
+    Manifest.resume. Outputs can be appended from several threads.
+
+    Args:
+        build_path (str): path of the build directory
+    """
+    filename = ".alsangue-journal"
+
+    def __init__(self, build_path):
+        self.path = join(build_path, self.filename)
+        self.file = None
+        self.lock = Lock()
+
+    def entries(self):
+        """Outputs written by the interrupted build, if any
+
+        Lines which are not complete, because the build was killed while
+        writing them, are ignored.
+
+        Returns:
+            (dict) paths of the outputs mapped to their dependencies
+        """
+        outputs = {}
+        if not exists(self.path):
+            return outputs
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    output, deps = loads(line)
+                except ValueError as e:
+                    continue
+                outputs[output] = deps
+        return outputs
+
+    def open(self, resume=False):
+        """Start logging, after the entries of the interrupted build when resuming"""
+        self.file = open(self.path, 'a' if resume else 'w')
+
+    def record(self, output, deps):
+        """Log a written output
+
+        Args:
+            output (str): path of the output relative to the build directory
+            deps (dict): dependencies of the output
+        """
+        line = dumps([output, deps]) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self, complete=True):
+        """Stop logging; the journal is removed if the build completed"""
+        if self.file != None:
+            self.file.close()
+            self.file = None
+        if complete and exists(self.path):
+            rm(self.path)
@@ -0,0 +1,83 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from re import compile as regex, DOTALL, IGNORECASE
+
+block_elements = ["html", "head", "body", "title", "meta", "link", "style", "script", "base",
+                  "div", "p", "ul", "ol", "li", "dl", "dt", "dd", "h1", "h2", "h3", "h4", "h5", "h6",
+                  "header", "footer", "nav", "main", "section", "article", "aside", "figure", "figcaption",
+                  "table", "thead", "tbody", "tfoot", "tr", "td", "th", "blockquote", "hr", "br", "form"]
+
+preserved = regex(r"(<(pre|textarea|script|style)\b[^>]*>)(.*?)(</\2\s*>)", DOTALL | IGNORECASE)
+comment = regex(r"<!--(?!\[if).*?-->", DOTALL)
+space = regex(r"\s+")
+block = "(?:" + "|".join(block_elements) + ")"
+before_block = regex(r"\s+(<!|</?" + block + r"\b)", IGNORECASE)
+after_block = regex(r"(<!DOCTYPE[^>]*>|</?" + block + r"\b[^>]*>)\s+", IGNORECASE)
+
+css_comment = regex(r"/\*.*?\*/", DOTALL)
+css_punctuation = regex(r"\s*([{};,])\s*")
+css_colon = regex(r":\s+")
+
+def minify_css(code):
+    """Remove comments and superfluous whitespace from a style sheet
+
+    Args:
+        code (str): the style sheet
+    Returns:
+        (str) the minified style sheet
+    """
+    code = css_comment.sub("", code)
+    code = space.sub(" ", code)
+    code = css_punctuation.sub(r"\1", code)
+    code = css_colon.sub(":", code)
+    return code.replace(";}", "}").strip()
+
+marker = regex("\x00([0-9]+)\x00")
+
+def minify_html(code):
+    """Remove comments and superfluous whitespace from an html page
+
+    Whitespace is collapsed to a single space and removed around block
+    elements, where it is not rendered; the content of pre, textarea and
+    script elements is kept as it is and the one of style elements is
+    minified as css.
+
+    Args:
+        code (str): the page
+    Returns:
+        (str) the minified page
+    """
+    contents = []
+    def keep(match):
+        content = match.group(3)
+        if match.group(2).lower() == "style":
+            content = minify_css(content)
+        contents.append(content)
+        return "{}\x00{}\x00{}".format(match.group(1), len(contents) - 1, match.group(4))
+    code = preserved.sub(keep, code)
+    code = comment.sub("", code)
+    code = space.sub(" ", code)
+    code = before_block.sub(r"\1", code)
+    code = after_block.sub(r"\1", code)
+    return marker.sub(lambda match : contents[int(match.group(1))], code).strip()
@@ -0,0 +1,188 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from alsangue.profile import count
+from alsangue.utils import save
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from gc import collect
+from os import sysconf
+from threading import Condition
+
+def prefetch(function, items, threads=4, window=None):
+    """Apply a function to items from a pool of threads, ahead of their consumer
+
+    Results are yielded in the order of the items; at most window items
+    are being processed or waiting to be consumed at any time, which bounds
+    the memory taken by the results.
+
+    Args:
+        function (callable): function of an item, usually reading a file
+        items (iterable): the items
+        threads (int): number of threads; with 0 the function is applied
+            when the result is consumed
+        window (int): items processed ahead, 4 per thread if None
+    Yields:
+        (tuple) an item and its result
+    """
+    if threads == 0:
+        for i in items:
+            yield i, function(i)
+        return
+    window = window if window != None else threads * 4
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = deque()
+        for i in items:
+            pending.append((i, pool.submit(function, i)))
+            if len(pending) >= window:
+                i, future = pending.popleft()
+                yield i, future.result()
+        while pending:
+            i, future = pending.popleft()
+            yield i, future.result()
+
+class Writer:
+    """Saves files from a pool of threads
+
+    Writer.save returns as soon as the content is queued, unless the queued
+    contents exceed a memory limit, in which case it waits for some of them
+    to be written. Errors raised while writing are passed to the error
+    callback of the file, if any, and raised again by Writer.close otherwise.
+    It can be used as a context manager, closing on exit.
+
+    Args:
+        threads (int): number of writing threads
+        limit (int): maximum size in bytes of the queued contents, Writer.limit if None
+    """
+    limit = 64*1024*1024
+
+    def __init__(self, threads=4, limit=None):
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        if limit != None:
+            self.limit = limit
+        self.pending = 0
+        self.errors = []
+        self.condition = Condition()
+
+    def save(self, code, file, done=None, failed=None):
+        """Queue a content to be saved in a file, see alsangue.utils.save
+
+        Args:
+            code (str or bytes): the content
+            file (str): path of the file
+            done (callable): called, from a writing thread, once the file is saved
+            failed (callable): called, from a writing thread, with the error
+                raised while saving the file
+        """
+        if type(code) == str:
+            code = code.encode('utf-8')
+        with self.condition:
+            while self.pending > 0 and self.pending + len(code) > self.limit:
+                self.condition.wait()
+            self.pending += len(code)
+        self.pool.submit(self.write, code, file, done, failed)
+
+    def write(self, code, file, done=None, failed=None):
+        """Save a content and release its memory from the queue"""
+        try:
+            save(code, file)
+            if done != None:
+                done()
+        except Exception as e:
+            if failed != None:
+                failed(e)
+            else:
+                self.errors.append(e)
+        finally:
+            with self.condition:
+                self.pending -= len(code)
+                self.condition.notify_all()
+
+    def drain(self):
+        """Wait for the queued contents to be saved, keeping the pool running"""
+        with self.condition:
+            while self.pending > 0:
+                self.condition.wait()
+
+    def close(self):
+        """Wait for the queued contents to be saved
+
+        Raises:
+            the first error raised while saving a file without error callback, if any
+        """
+        self.pool.shutdown(wait=True)
+        if self.errors != []:
+            raise self.errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        if kind == None:
+            self.close()
+        else:
+            self.pool.shutdown(wait=True)
+
+def rss():
+    """Resident memory of the current process in bytes, 0 where it cannot be read"""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError) as e:
+        return 0
+
+class MemoryGuard:
+    """Keeps the resident memory of a process below a ceiling
+
+    MemoryGuard.check is called while streaming pages; every few calls the
+    resident memory is measured and, when it is above the limit, memory is
+    reclaimed by the given functions (i.e. draining a Writer) and by the
+    garbage collector. MemoryError is raised if that is not enough.
+
+    Args:
+        limit (int): ceiling in bytes, None for no limit
+        every (int): calls between two measurements
+    """
+    def __init__(self, limit=None, every=32):
+        self.limit = limit
+        self.every = every
+        self.calls = 0
+
+    def check(self, *reclaim):
+        """Measure the memory and reclaim it if it is above the limit
+
+        Args:
+            reclaim (callable): functions releasing memory, called in order
+        Raises:
+            MemoryError: the memory is still above the limit
+        """
+        self.calls += 1
+        if self.limit == None or self.calls % self.every != 0 or rss() <= self.limit:
+            return
+        for f in reclaim:
+            f()
+        collect()
+        count("memory reclaims")
+        used = rss()
+        if used > self.limit:
+            raise MemoryError("resident memory of {:.0f} MiB exceeds the limit of {:.0f} MiB".format(used / 2**20, self.limit / 2**20))
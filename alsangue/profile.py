@@ -0,0 +1,199 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from contextlib import contextmanager, nullcontext
+from json import dump
+from os import getpid, replace
+from threading import Lock
+from time import perf_counter, process_time
+import tracemalloc
+
+lock = Lock()
+
+class Profiler:
+    """Records the time and memory spent in the stages of a build
+
+    A stage is timed with Profiler.stage (or the module level stage function);
+    stages can be nested. For every stage the wall clock time, the CPU time of
+    the process and the peak of the memory allocated by Python while the stage
+    was running are recorded. Counters (files read, bytes written...) are
+    increased with Profiler.count.
+
+    Worker processes profile the tasks they execute with their own profiler;
+    their records are sent back with Profiler.collect and added with Profiler.merge.
+
+    Args:
+        path (str): where the JSON report (a Chrome trace) is saved
+        memory (bool): trace memory allocations to measure peak memory
+    """
+    def __init__(self, path=None, memory=True):
+        self.path = path
+        self.memory = memory
+        self.records = []
+        self.counters = {}
+        self.stack = []
+
+    def start(self):
+        """Start tracing memory allocations in the current process"""
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def peak(self):
+        """Peak of the traced memory since the last reset, in bytes"""
+        if not tracemalloc.is_tracing():
+            return 0
+        return tracemalloc.get_traced_memory()[1]
+
+    @contextmanager
+    def stage(self, name, argument=None):
+        """Time a stage
+
+        Args:
+            name (str): name of the stage, i.e. "build_article"
+            argument (str): what the stage is working on, i.e. the path of an article
+        """
+        if self.stack != []:
+            self.stack[-1][0] = max(self.stack[-1][0], self.peak())
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        frame = [0]
+        self.stack.append(frame)
+        start, cpu = perf_counter(), process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = perf_counter() - start, process_time() - cpu
+            self.stack.pop()
+            peak = max(frame[0], self.peak())
+            if self.stack != []:
+                self.stack[-1][0] = max(self.stack[-1][0], peak)
+            self.records.append((name, argument, getpid(), start, wall, cpu, peak, len(self.stack)))
+
+    def count(self, name, n=1):
+        """Increase a counter
+
+        Args:
+            name (str): name of the counter, i.e. "files read"
+            n (int): increment
+        """
+        with lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def collect(self):
+        """Take the records and the counters gathered so far, see Profiler.merge
+
+        Returns:
+            (tuple) list of records and dictionary of counters
+        """
+        records, counters = self.records, self.counters
+        self.records, self.counters = [], {}
+        return records, counters
+
+    def merge(self, records, counters):
+        """Add records and counters gathered by another process"""
+        depth = len(self.stack)
+        self.records += [r[:7] + (r[7] + depth,) for r in records]
+        for name, n in counters.items():
+            self.count(name, n)
+
+    def summary(self):
+        """Records aggregated by stage name, in order of first appearance
+
+        Returns:
+            (list) dictionaries with keys "stage", "depth", "calls", "wall",
+            "cpu" and "peak" (seconds and bytes)
+        """
+        stages = {}
+        for name, argument, pid, start, wall, cpu, peak, depth in sorted(self.records, key=lambda r : r[3]):
+            s = stages.setdefault(name, {"stage":name, "depth":depth, "calls":0, "wall":0, "cpu":0, "peak":0})
+            s["depth"] = min(s["depth"], depth)
+            s["calls"] += 1
+            s["wall"] += wall
+            s["cpu"] += cpu
+            s["peak"] = max(s["peak"], peak)
+        return list(stages.values())
+
+    def table(self):
+        """Human readable report
+
+        Returns:
+            (str) one row for every stage followed by the counters
+        """
+        rows = ["{:<28} {:>7} {:>10} {:>10} {:>10}".format("stage", "calls", "wall (s)", "cpu (s)", "peak (MiB)")]
+        for s in self.summary():
+            rows.append("{:<28} {:>7} {:>10.3f} {:>10.3f} {:>10.1f}".format("  " * s["depth"] + s["stage"], s["calls"],
+                                                                             s["wall"], s["cpu"], s["peak"] / 2**20))
+        rows.append("")
+        rows.append("{:<28} {:>7}".format("counter", "value"))
+        for name, n in sorted(self.counters.items()):
+            rows.append("{:<28} {:>7}".format(name, n))
+        return "\n".join(rows)
+
+    def trace(self):
+        """Machine readable report in the Chrome trace event format
+
+        The file can be opened with chrome://tracing or Perfetto; the summary
+        and the counters are stored along with the events.
+
+        Returns:
+            (dict) the report
+        """
+        origin = min([r[3] for r in self.records], default=0)
+        events = []
+        for name, argument, pid, start, wall, cpu, peak, depth in self.records:
+            args = {"cpu":cpu, "peak":peak}
+            if argument != None:
+                args["path"] = argument
+            events.append({"name":name, "cat":"alsangue", "ph":"X", "pid":pid, "tid":pid,
+                           "ts":(start - origin) * 1e6, "dur":wall * 1e6, "args":args})
+        return {"traceEvents":events, "displayTimeUnit":"ms",
+                "stages":self.summary(), "counters":self.counters}
+
+    def report(self):
+        """Print the table, save the trace and start recording again"""
+        print(self.table())
+        if self.path != None:
+            with open(self.path + ".tmp", 'w') as f:
+                dump(self.trace(), f)
+            replace(self.path + ".tmp", self.path)
+        self.records, self.counters = [], {}
+
+profiler = None
+
+def set_profiler(p):
+    """Profile the current process with a profiler, or stop profiling if p is None"""
+    global profiler
+    profiler = p
+    if p != None:
+        p.start()
+
+def stage(name, argument=None):
+    """Time a stage with the current profiler, if any; see Profiler.stage"""
+    if profiler == None:
+        return nullcontext()
+    return profiler.stage(name, argument)
+
+def count(name, n=1):
+    """Increase a counter of the current profiler, if any; see Profiler.count"""
+    if profiler != None:
+        profiler.count(name, n)
@@ -0,0 +1,72 @@
+/*
+    alsangue
+
+    ----------------------------------------------------------------------
+    Copyright © 2018  Pellegrino Prevete
+
+    All rights reserved
+    ----------------------------------------------------------------------
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+*/
+
+/*
+    Client of the search index written by alsangue (see alsangue/search.py).
+
+    alsangueSearch(query) resolves to the articles containing every word of
+    the query, as {name, title, url, score} objects by decreasing score.
+    Only index.json and the shards of the words of the query are fetched,
+    once per page.
+*/
+(function () {
+    var base = document.currentScript.src.replace(/[^\/]*$/, "");
+    var index = null;
+    var shards = {};
+
+    function get(name) {
+        return fetch(base + name).then(function (response) { return response.json(); });
+    }
+
+    function words(text) {
+        return text.toLowerCase().match(/[\p{L}\p{N}_]{2,}/gu) || [];
+    }
+
+    window.alsangueSearch = function (query) {
+        return (index = index || get("index.json")).then(function (header) {
+            var terms = words(query);
+            var keys = terms.map(function (w) { return w.slice(0, header.prefix); });
+            return Promise.all(keys.map(function (key) {
+                if (header.shards.indexOf(key) < 0) {
+                    return Promise.resolve({});
+                }
+                return (shards[key] = shards[key] || get(encodeURIComponent(key) + ".json"));
+            })).then(function (postings) {
+                var scores = null;
+                terms.forEach(function (w, i) {
+                    var found = {};
+                    (postings[i][w] || []).forEach(function (p) {
+                        if (scores === null || p[0] in scores) {
+                            found[p[0]] = (scores === null ? 0 : scores[p[0]]) + p[1];
+                        }
+                    });
+                    scores = found;
+                });
+                return Object.keys(scores || {}).map(function (name) {
+                    var d = header.documents[name];
+                    return {name: name, title: d[0], url: d[1], score: scores[name]};
+                }).sort(function (a, b) { return b.score - a.score; });
+            });
+        });
+    };
+})();
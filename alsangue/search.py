@@ -0,0 +1,162 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+
+from html.parser import HTMLParser
+from json import dumps, load
+from os import replace
+from os.path import exists
+from re import compile as regex
+
+word = regex(r"\w{2,}")
+
+class TextExtractor(HTMLParser):
+    """Collects the text of an html snippet, leaving out scripts and style sheets"""
+    def __init__(self, code):
+        HTMLParser.__init__(self)
+        self.text = []
+        self.skip = 0
+        self.feed(code)
+        self.close()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ["script", "style"]:
+            self.skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in ["script", "style"] and self.skip > 0:
+            self.skip -= 1
+
+    def handle_data(self, data):
+        if self.skip == 0:
+            self.text.append(data)
+
+def terms(title, content):
+    """Score the words of an article
+
+    Args:
+        title (str): title of the article
+        content (str): html code of the article
+    Returns:
+        (dict) lowercase words mapped to their number of occurrences, those
+        in the title counting 5 times
+    """
+    scores = {}
+    for w in word.findall(" ".join(TextExtractor(content).text).casefold()):
+        scores[w] = scores.get(w, 0) + 1
+    for w in word.findall(title.casefold()):
+        scores[w] = scores.get(w, 0) + 5
+    return scores
+
+class SearchIndex:
+    """Inverted index of the articles of a locale, split in shards by word prefix
+
+    The words of every article are kept, with the last edit of the article,
+    in a file in the build directory, so that only changed articles have
+    to be read again. The shard of a word is the file named after its first
+    prefix characters: a client fetches the index (index.json: documents
+    and shard names) and the shards of the words it looks for. Shards hold
+    the articles containing every word, by decreasing score, as
+    {word:[[name, score], ...]}.
+
+    Args:
+        path (str): file where the words of the articles are kept
+        prefix (int): length of the word prefixes naming the shards
+    """
+    def __init__(self, path, prefix=2):
+        self.path = path
+        self.prefix = prefix
+        self.documents = {}
+        self.changed = set()
+        if exists(path):
+            try:
+                with open(path, 'r') as f:
+                    state = load(f)
+                if state.get("prefix") == prefix:
+                    self.documents = state["documents"]
+            except ValueError as e:
+                self.documents = {}
+
+    def key(self, w):
+        """Name of the shard of a word"""
+        return w[:self.prefix]
+
+    def outdated(self, name, mtime):
+        """Tell if an article has to be read again"""
+        return not name in self.documents or self.documents[name][0] != mtime
+
+    def add(self, name, mtime, title, url, scores):
+        """Add, or replace, an article
+
+        Args:
+            name (str): name of the article, identifying it in the shards
+            mtime (float): last edit of the article
+            title (str): title of the article
+            url (str): url of the page of the article
+            scores (dict): words of the article and their scores, see terms
+        """
+        self.remove(name)
+        self.documents[name] = [mtime, title, url, scores]
+        self.changed |= {self.key(w) for w in scores}
+
+    def remove(self, name):
+        """Remove an article, if present"""
+        if name in self.documents:
+            self.changed |= {self.key(w) for w in self.documents.pop(name)[3]}
+
+    def keys(self):
+        """Names of all the shards"""
+        return sorted({self.key(w) for d in self.documents.values() for w in d[3]})
+
+    def shards(self, keys):
+        """Postings of the words of some shards, gathered in one pass
+
+        Args:
+            keys (iterable): names of the shards
+        Returns:
+            (dict) shard names mapped to dictionaries of words mapped to
+            [name, score] pairs, by decreasing score
+        """
+        shards = {k:{} for k in keys}
+        n = self.prefix
+        for name, (mtime, title, url, scores) in sorted(self.documents.items()):
+            for w, score in scores.items():
+                if w[:n] in shards:
+                    shards[w[:n]].setdefault(w, []).append([name, score])
+        for k, postings in shards.items():
+            for w in postings:
+                postings[w].sort(key=lambda p : -p[1])
+            shards[k] = dict(sorted(postings.items()))
+        return shards
+
+    def header(self):
+        """Content of index.json: prefix length, shard names and documents by name"""
+        return {"prefix":self.prefix, "shards":self.keys(),
+                "documents":{name:[d[1], d[2]] for name, d in sorted(self.documents.items())}}
+
+    def save(self):
+        """Keep the words of the articles for the next build"""
+        with open(self.path + ".tmp", 'w') as f:
+            f.write(dumps({"prefix":self.prefix, "documents":self.documents}))
+        replace(self.path + ".tmp", self.path)
+        self.changed = set()
@@ -0,0 +1,106 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+
+from alsangue.template import Template
+from alsangue.utils import dict_from_file
+from os.path import getmtime
+
+class Session:
+    """Caches shared by the builders of several websites in one process
+
+    Builders given the same session parse every locale file and compile
+    every template source once, and share the rendered fragments (see
+    alsangue.fragments), which are keyed by their inputs.
+    """
+    def __init__(self):
+        self.locales = {}
+        self.templates = {}
+        self.fragments = {}
+
+    def locale(self, path):
+        """Content of a locale file, read again only if it changed
+
+        Args:
+            path (str): path of the locale file
+        Returns:
+            (dict) the locale
+        """
+        mtime = getmtime(path)
+        if not path in self.locales or self.locales[path][0] != mtime:
+            self.locales[path] = (mtime, dict_from_file(path))
+        return self.locales[path][1]
+
+    def template(self, text):
+        """Template compiled from html code, once per distinct code
+
+        Args:
+            text (str): html code of the template
+        Returns:
+            (Template) the compiled template
+        """
+        if not text in self.templates:
+            self.templates[text] = Template(text)
+        return self.templates[text]
+
+class BuildResult:
+    """Outcome of a build, see Builder.report
+
+    Args:
+        content_path (str): path of the content directory
+        build_path (str): path of the build directory
+        outputs (int): number of outputs of the website
+        rendered (list): outputs rendered by the build, or which a dry run
+            would render, as paths relative to the build directory
+        stale (list): outputs of previous builds no longer produced
+        errors (list): (file, description) pairs of the errors of the build
+        seconds (float): duration of the build
+        counters (dict): counters of the profiler, if any
+        dry_run (bool): the build has only been planned
+    """
+    __slots__ = ("content_path", "build_path", "outputs", "rendered", "stale", "errors", "seconds", "counters", "dry_run")
+
+    def __init__(self, content_path, build_path, outputs=0, rendered=[], stale=[], errors=[], seconds=0, counters={}, dry_run=False):
+        self.content_path = content_path
+        self.build_path = build_path
+        self.outputs = outputs
+        self.rendered = rendered
+        self.stale = stale
+        self.errors = errors
+        self.seconds = seconds
+        self.counters = counters
+        self.dry_run = dry_run
+
+    @property
+    def ok(self):
+        """True if the build had no errors"""
+        return self.errors == []
+
+    def as_dict(self):
+        """The result as a JSON serializable dictionary"""
+        result = {k:getattr(self, k) for k in self.__slots__}
+        result["errors"] = [list(e) for e in self.errors]
+        return result
+
+    def __repr__(self):
+        return "BuildResult({}: {} of {} outputs rendered, {} errors)".format(self.content_path, len(self.rendered), self.outputs, len(self.errors))
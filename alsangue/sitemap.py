@@ -0,0 +1,146 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from alsangue.profile import count
+from alsangue.utils import commit, ls, xml_escape as escape, xml_quoteattr as quoteattr
+from gzip import GzipFile
+from os import remove as rm
+from os.path import join
+from re import compile as regex
+
+header = '<?xml version="1.0" encoding="UTF-8"?>\n'
+urlset_open = '<urlset xmlns:xhtml="http://www.w3.org/1999/xhtml" xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+urlset_close = '</urlset>\n'
+index_open = '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+index_close = '</sitemapindex>\n'
+
+part_name = regex(r"^sitemap-[0-9]+\.xml(\.gz)?$")
+
+class Sitemap:
+    """Streaming sitemap writer
+
+    Urls are written to disk as soon as they are added. When a sitemap file
+    reaches the limits of the sitemap protocol (50,000 urls or 50 MB) a new
+    one is started; if more than one file has been written, or gzip output
+    is requested, the files are named sitemap-N.xml(.gz) and sitemap.xml
+    becomes a sitemap index pointing to them.
+
+    Files are written under temporary names and moved in place by save,
+    so an interrupted build leaves the previous sitemap untouched; files
+    whose content did not change are left untouched as well.
+
+    Args:
+        path (str): directory where the sitemap is saved; if None, urls are discarded
+        domain (str): url of the website, used in the sitemap index
+        gzip (bool): compress the sitemap files
+        max_urls (int): maximum number of urls in a sitemap file
+        max_size (int): maximum size in bytes of an uncompressed sitemap file
+    """
+    def __init__(self, path, domain="", gzip=False, max_urls=50000, max_size=50*1024*1024):
+        self.path = path
+        self.domain = domain
+        self.gzip = gzip
+        self.max_urls = max_urls
+        self.max_size = max_size - len(urlset_close)
+        self.parts = []
+        self.file = None
+
+    def open_part(self):
+        """Start a new sitemap file"""
+        self.close_part()
+        self.parts.append(join(self.path, ".sitemap-{}.xml.tmp".format(len(self.parts) + 1)))
+        if self.gzip:
+            self.file = GzipFile(self.parts[-1], 'wb', mtime=0)
+        else:
+            self.file = open(self.parts[-1], 'wb')
+        self.count = 0
+        self.size = 0
+        self.write(header + urlset_open)
+
+    def close_part(self):
+        """Terminate the current sitemap file"""
+        if self.file != None:
+            self.file.write(urlset_close.encode('utf-8'))
+            self.file.close()
+            self.file = None
+
+    def write(self, code):
+        """Write xml code in the current sitemap file"""
+        code = code.encode('utf-8')
+        self.file.write(code)
+        self.size += len(code)
+        count("bytes written", len(code))
+
+    def add_url(self, loc, lastmod=None, locales={}, changefreq='monthly', priority='0.5'):
+        """Write the entry of a page
+
+        Args:
+            loc (str): url of the page
+            lastmod (str): date of the last edit of the page (YYYY-MM-DD)
+            locales (dict): urls of the translations of the page keyed by locale code
+            changefreq (str): how frequently the page is likely to change
+            priority (str): priority of the page relative to the other ones
+        """
+        if self.path == None:
+            return
+        entry = ["<url><loc>", escape(loc), "</loc>"]
+        if lastmod != None:
+            entry += ["<lastmod>", escape(lastmod), "</lastmod>"]
+        for code in locales.keys():
+            entry.append('<xhtml:link rel="alternate" hreflang={} href={}/>'.format(quoteattr(code), quoteattr(locales[code])))
+        entry += ["<changefreq>", changefreq, "</changefreq>"]
+        entry += ["<priority>", priority, "</priority></url>\n"]
+        entry = "".join(entry)
+
+        if self.file == None or self.count == self.max_urls or self.size + len(entry.encode('utf-8')) > self.max_size:
+            self.open_part()
+        self.write(entry)
+        self.count += 1
+
+    def save(self):
+        """Move the sitemap files in place and write the sitemap index if needed"""
+        if self.parts == []:
+            self.open_part()
+        self.close_part()
+
+        extension = ".xml.gz" if self.gzip else ".xml"
+        names = []
+        if len(self.parts) == 1 and not self.gzip:
+            commit(self.parts[0], join(self.path, "sitemap.xml"))
+        else:
+            index = [header, index_open]
+            for i, part in enumerate(self.parts):
+                names.append("sitemap-{}{}".format(i + 1, extension))
+                commit(part, join(self.path, names[-1]))
+                url = "/".join([self.domain.rstrip("/"), names[-1]]) if self.domain else names[-1]
+                index.append("<sitemap><loc>{}</loc></sitemap>\n".format(escape(url)))
+            index.append(index_close)
+            with open(join(self.path, ".sitemap.xml.tmp"), 'wb') as f:
+                f.write("".join(index).encode('utf-8'))
+                count("bytes written", f.tell())
+            commit(join(self.path, ".sitemap.xml.tmp"), join(self.path, "sitemap.xml"))
+
+        for f in ls(self.path):
+            if part_name.match(f) and not f in names:
+                rm(join(self.path, f))
+        self.parts = []
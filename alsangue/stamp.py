@@ -0,0 +1,127 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from alsangue.utils import hidden
+from hashlib import sha1
+from json import dumps
+from os import replace, stat, walk
+from os import remove as rm
+from os.path import join, exists, isdir
+from time import time_ns
+
+def files(paths):
+    """Non hidden files in some directory trees, in a fixed order
+
+    Args:
+        paths (list): directories, or single files
+    """
+    for path in paths:
+        if not isdir(path):
+            yield path
+            continue
+        for root, dirs, names in walk(path):
+            dirs[:] = sorted(d for d in dirs if not hidden(d))
+            for f in sorted(names):
+                if not hidden(f):
+                    yield join(root, f)
+
+def signature(paths):
+    """Digest of the names, sizes and modification times of some files
+
+    Args:
+        paths (list): directories or files, see files
+    Returns:
+        (tuple) the digest and the latest modification time, in nanoseconds
+    """
+    digest = sha1()
+    latest = 0
+    for f in files(paths):
+        try:
+            st = stat(f)
+            entry = "{}\x00{}\x00{}\n".format(f, st.st_size, st.st_mtime_ns)
+            latest = max(latest, st.st_mtime_ns)
+        except OSError as e:
+            entry = "{}\x00missing\n".format(f)
+        digest.update(entry.encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest(), latest
+
+class Stamp:
+    """Tells, without loading anything, that a website is as its last build left it
+
+    The stamp is a digest of the names, sizes and modification times of the
+    inputs (content, locales...) and of the outputs of a build, along with the
+    options the outputs depend on; it is saved in the build directory after a
+    successful build. As long as it matches, an incremental build would not
+    write anything, so it can be skipped altogether.
+
+    A stamp is not saved when an input changed less than a second before, as
+    a later change in the same tick of the clock of the file system could go
+    unnoticed.
+
+    Args:
+        build_path (str): path of the build directory, whose non hidden files
+            are the outputs
+        inputs (list): directories and files the build reads
+        options (list): anything else the outputs depend on, serializable as JSON
+    """
+    filename = ".alsangue-stamp"
+    racy = 10**9
+
+    def __init__(self, build_path, inputs, options):
+        self.path = join(build_path, self.filename)
+        self.build_path = build_path
+        self.inputs = inputs
+        self.options = options
+
+    def current(self):
+        """Stamp of the website as it is now
+
+        Returns:
+            (tuple) the stamp and the latest modification time of the inputs
+        """
+        inputs, latest = signature(self.inputs)
+        outputs = signature([self.build_path])[0]
+        return dumps([self.options, inputs, outputs]), latest
+
+    def valid(self):
+        """Tell if the saved stamp matches the website"""
+        if not exists(self.path):
+            return False
+        with open(self.path, 'r') as f:
+            saved = f.read()
+        return saved == self.current()[0]
+
+    def save(self):
+        """Stamp the website as built, unless an input changed too recently"""
+        stamp, latest = self.current()
+        if latest > time_ns() - self.racy:
+            self.clear()
+            return
+        with open(self.path + ".tmp", 'w') as f:
+            f.write(stamp)
+        replace(self.path + ".tmp", self.path)
+
+    def clear(self):
+        """Remove the saved stamp"""
+        if exists(self.path):
+            rm(self.path)
@@ -0,0 +1,211 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from html import escape
+from html.parser import HTMLParser
+from re import compile as regex
+
+void_elements = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+                 "link", "meta", "param", "source", "track", "wbr"}
+
+valid_attribute = regex(r"^[a-zA-Z_:][-a-zA-Z0-9_:.]*$")
+
+def start_tag(tag, attrs):
+    """Serialize the start tag of an element
+
+    Args:
+        tag (str): name of the element
+        attrs (list): (name, value) pairs; a None value gives an empty attribute
+    Returns:
+        (str) the start tag
+    """
+    code = [tag]
+    for k, v in attrs:
+        if v == None:
+            code.append(k)
+        else:
+            code.append('{}="{}"'.format(k, escape(v)))
+    return "<" + " ".join(code) + ">"
+
+def element(tag, text=None, html="", **attrs):
+    """Serialize an element
+
+    Args:
+        tag (str): name of the element
+        text (str): text content of the element, it will be escaped
+        html (str): html content of the element, used when text is None
+        attrs (str): attributes of the element ("class_" stands for "class")
+    Returns:
+        (str) the element
+    """
+    attrs = [(k.rstrip("_"), v) for k, v in attrs.items()]
+    if text != None:
+        html = escape(text, quote=False)
+    return start_tag(tag, attrs) + html + "</" + tag + ">"
+
+def fragment(code):
+    """Normalize an html snippet, closing its unbalanced tags
+
+    The parsed tree is decomposed once serialized, so that its memory is
+    released at once instead of by the cyclic garbage collector. BeautifulSoup
+    is imported on the first call, so that commands which render nothing do
+    not pay for it.
+
+    Args:
+        code (str): html code
+    Returns:
+        (str) the normalized html code
+    """
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(code, 'html.parser')
+    code = str(soup)
+    soup.decompose()
+    return code
+
+class TemplateParser(HTMLParser):
+    """Locates the elements having an id in a template
+
+    After feeding, 'elements' maps every id to a list of the form
+    [tag, attrs, start tag offset, content offset, end tag offset]; the end
+    tag offset is None for void elements and elements never closed.
+    """
+    def __init__(self, text):
+        HTMLParser.__init__(self, convert_charrefs=False)
+        self.lines = [0]
+        for line in text.split("\n"):
+            self.lines.append(self.lines[-1] + len(line) + 1)
+        self.elements = {}
+        self.stack = []
+        self.feed(text)
+        self.close()
+
+    def position(self):
+        line, column = self.getpos()
+        return self.lines[line - 1] + column
+
+    def handle_starttag(self, tag, attrs):
+        start = self.position()
+        end = start + len(self.get_starttag_text())
+        ids = [v for k, v in attrs if k == "id"]
+        if ids != [] and not ids[0] in self.elements:
+            self.elements[ids[0]] = [tag, attrs, start, end, None]
+            if not tag in void_elements:
+                self.stack.append((tag, ids[0]))
+        elif not tag in void_elements:
+            self.stack.append((tag, None))
+
+    def handle_startendtag(self, tag, attrs):
+        start = self.position()
+        end = start + len(self.get_starttag_text())
+        ids = [v for k, v in attrs if k == "id"]
+        if ids != [] and not ids[0] in self.elements:
+            self.elements[ids[0]] = [tag, attrs, start, end, None]
+
+    def handle_endtag(self, tag):
+        if not tag in [t for t, i in self.stack]:
+            return
+        while self.stack != []:
+            t, i = self.stack.pop()
+            if i != None:
+                self.elements[i][4] = self.position()
+            if t == tag:
+                break
+
+class Template:
+    """An html template compiled into static chunks and named slots
+
+    Every element having an id attribute becomes a slot. The template is
+    parsed once; a page is then rendered by joining the static chunks with
+    the values given for the slots, without building any tree.
+
+    The value of a slot is a dictionary which may contain:
+        - attrs (dict): attributes to set on the element;
+        - text (str): text replacing the content of the element;
+        - html (str): html code replacing the content of the element;
+        - append (str): html code appended to the content of the element.
+
+    Args:
+        text (str): html code of the template
+    """
+    def __init__(self, text):
+        elements = TemplateParser(text).elements
+
+        cuts = []
+        for i, (tag, attrs, start, content, end) in elements.items():
+            attrs = [(k, v) for k, v in attrs if valid_attribute.match(k)]
+            cuts.append((start, content, ("open", i, tag, attrs)))
+            if end != None:
+                cuts.append((content, content, ("content", i)))
+                cuts.append((end, end, ("close", i)))
+        cuts.sort(key=lambda c : (c[0], c[1]))
+
+        self.ids = set(elements.keys())
+        self.chunks = []
+        position = 0
+        for start, end, slot in cuts:
+            self.chunks.append(text[position:start])
+            self.chunks.append(slot)
+            position = end
+        self.chunks.append(text[position:])
+
+    def render(self, slots):
+        """Fill the slots of the template
+
+        Args:
+            slots (dict): values of the slots keyed by element id
+        Returns:
+            (str) html code of the page
+        """
+        for i in slots:
+            if not i in self.ids:
+                raise KeyError("template has no element with id '{}'".format(i))
+        code = []
+        skip = None
+        for chunk in self.chunks:
+            if type(chunk) == str:
+                if skip == None:
+                    code.append(chunk)
+                continue
+            kind, i = chunk[0], chunk[1]
+            if skip != None:
+                if kind == "close" and i == skip:
+                    skip = None
+                else:
+                    continue
+            slot = slots.get(i, {})
+            if kind == "open":
+                attrs = chunk[3]
+                if "attrs" in slot:
+                    attrs = [(k, v) for k, v in attrs if not k in slot["attrs"]]
+                    attrs = attrs + list(slot["attrs"].items())
+                code.append(start_tag(chunk[2], attrs))
+            elif kind == "content":
+                if "text" in slot:
+                    code.append(escape(slot["text"], quote=False))
+                    skip = i
+                elif "html" in slot:
+                    code.append(slot["html"])
+                    skip = i
+            elif kind == "close":
+                code.append(slot.get("append", ""))
+        return "".join(code)
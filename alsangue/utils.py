@@ -0,0 +1,206 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from alsangue.dates import format_date
+from alsangue.loaders import read_document
+from alsangue.profile import count
+from os import listdir, readlink, replace, symlink
+from os import remove as rm
+from os.path import join, dirname, getmtime, getsize, exists, islink
+from time import localtime
+
+hidden = lambda f : f.startswith('.')
+
+def ls(dir):
+    """Returns non hidden files in a dir
+
+    Args:
+        dir (str): path of the dir to be read
+    """
+    files = listdir(dir)
+    return [f for f in files if not hidden(f)]
+
+def date_print(date, l=None):
+    """Converts ISO 8601 calendar date (YYYY-MM-DD) in a fancy format
+    
+    Args:
+        date (str): YYYY/MM/DD
+        l (dict): locale giving the month names, English if None
+    Returns:
+        The date converted (i.e. 26 August 2018)
+    """
+    year, month, day = date.split("/")
+    return format_date((int(year), int(month), int(day)), l)
+
+def getlastedit(f,sitemap=False, l=None):
+    """Return the date of the last edit of a file
+    
+    Args:
+        f (str): path of the file
+        sitemap (bool): return the date as YYYY-MM-DD
+        l (dict): locale giving the month names, English if None
+    Returns:
+        The date in the fancy format (i.e. 26 August 2018)
+    """
+    return date_from_epoch(getmtime(f), sitemap, l)
+
+def date_from_epoch(epoch, sitemap=False, l=None):
+    """Return a date given in seconds since the epoch, see getlastedit"""
+    date = localtime(epoch)
+    if sitemap:
+        return format_date(date, format='%Y-%m-%d')
+    return format_date(date, l)
+
+def dict_from_file(f):
+    """Load a Python dictionary read from a file into a variable
+
+    The file is read by the loader registered for its extension (see
+    alsangue.loaders): JSON, html or markdown with front matter, or a
+    Python dictionary otherwise. Parsed files are cached when a cache
+    has been set with alsangue.loaders.set_cache.
+
+    Args:
+        f (str): path of the file containing the dictionary
+    Returns:
+        content (dict): the dictionary read from the file
+    """
+    count("dict_from_file calls")
+    return read_document(f)
+
+def load(f):
+    """Load a text file into a variable
+    
+    Args:
+        f (str): path of the text file
+    Returns:
+        content (str): the variable containing the text
+    """
+    with open(f) as g:
+        content = g.read()
+        g.close()
+    count("files read")
+    return content
+
+def xml_escape(text):
+    """Escape &, < and > in xml text, as xml.sax.saxutils.escape
+
+    The saxutils module imports urllib and ssl; this one line does not.
+    """
+    return text.replace("&", "&amp;").replace(">", "&gt;").replace("<", "&lt;")
+
+def xml_quoteattr(value):
+    """Escaped and quoted xml attribute value, as xml.sax.saxutils.quoteattr"""
+    value = xml_escape(value).replace("\n", "&#10;").replace("\r", "&#13;").replace("\t", "&#9;")
+    if not '"' in value:
+        return '"' + value + '"'
+    if not "'" in value:
+        return "'" + value + "'"
+    return '"' + value.replace('"', "&quot;") + '"'
+
+def temporary(file):
+    """Hidden path, next to a file, where the file can be written before being moved in place"""
+    return join(dirname(file), "." + file.split("/")[-1] + ".tmp")
+
+def same_content(f, data):
+    """Tell if a file exists and contains some bytes
+
+    Args:
+        f (str): path of the file
+        data (bytes): the content
+    """
+    if not exists(f) or islink(f) or getsize(f) != len(data):
+        return False
+    with open(f, 'rb') as g:
+        return g.read() == data
+
+def save(soup, file):
+    """Save a soup object in file
+
+    Nothing is written if the file already has the same content, so that its
+    modification time is kept; otherwise the content is written to a temporary
+    file which is then renamed, so that the file is never seen half-written
+    (the temporary file is removed if writing is interrupted).
+
+    Args:
+        soup: instance of BeautifulSoup object, str or bytes
+        file (str): path of the file
+    Returns:
+        (bool) True if the file has been written
+    """
+    if type(soup) == str:
+        soup = soup.encode('utf-8')
+    elif type(soup) != bytes:
+        soup = str(soup).encode('utf-8')
+    if same_content(file, soup):
+        count("files unchanged")
+        return False
+    tmp = temporary(file)
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(soup)
+            f.close()
+        replace(tmp, file)
+    except BaseException as e:
+        if exists(tmp):
+            rm(tmp)
+        raise
+    count("files written")
+    count("bytes written", len(soup))
+    return True
+
+def commit(tmp, file):
+    """Move a written temporary file in place, unless the file already has the same content
+
+    Args:
+        tmp (str): path of the temporary file
+        file (str): path of the file
+    Returns:
+        (bool) True if the file has been replaced
+    """
+    with open(tmp, 'rb') as f:
+        data = f.read()
+    if same_content(file, data):
+        rm(tmp)
+        count("files unchanged")
+        return False
+    replace(tmp, file)
+    count("files written")
+    return True
+
+def link(target, file):
+    """Make a file a symbolic link to a target, atomically, if it is not already
+
+    Args:
+        target (str): path the link points to
+        file (str): path of the link
+    Returns:
+        (bool) True if the link has been (re)created
+    """
+    if islink(file) and readlink(file) == target:
+        return False
+    tmp = temporary(file)
+    if islink(tmp) or exists(tmp):
+        rm(tmp)
+    symlink(target, tmp)
+    replace(tmp, file)
+    return True
@@ -0,0 +1,180 @@
+#    alsangue
+#
+#    ----------------------------------------------------------------------
+#    Copyright © 2018  Pellegrino Prevete
+#
+#    All rights reserved
+#    ----------------------------------------------------------------------
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+
+
+from alsangue.utils import hidden
+from ctypes import CDLL, get_errno
+from functools import partial
+from os import close, fsencode, read, stat, walk
+from os.path import join, isdir
+from select import select
+from struct import calcsize, unpack_from
+from threading import Thread
+from time import sleep, monotonic
+
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+event_header = "iIII"
+
+ignored = lambda f : hidden(f) or f.endswith("~")
+
+class Watcher:
+    """Watches a directory tree for changes
+
+    Uses inotify where available and falls back to polling the
+    modification times of the files otherwise.
+
+    Args:
+        path (str): directory to watch, recursively
+        interval (float): seconds between two polls when polling
+        settle (float): seconds to wait for further changes once one is detected
+    """
+    def __init__(self, path, interval=0.25, settle=0.05):
+        self.path = path
+        self.interval = interval
+        self.settle = settle
+        self.fd = None
+        self.watches = {}
+        try:
+            from ctypes.util import find_library
+            self.libc = CDLL(find_library("c"), use_errno=True)
+            fd = self.libc.inotify_init1(IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(get_errno(), "inotify_init1 failed")
+            self.fd = fd
+            for root, dirs, files in walk(path):
+                dirs[:] = [d for d in dirs if not ignored(d)]
+                self.add_watch(root)
+        except (OSError, AttributeError) as e:
+            if self.fd != None:
+                close(self.fd)
+            self.fd = None
+            self.snapshot = self.scan()
+
+    def add_watch(self, directory):
+        """Start watching a directory with inotify"""
+        wd = self.libc.inotify_add_watch(self.fd, fsencode(directory), mask)
+        if wd < 0:
+            raise OSError(get_errno(), "inotify_add_watch failed on " + directory)
+        self.watches[wd] = directory
+
+    def scan(self):
+        """Modification time and size of every file in the tree"""
+        snapshot = {}
+        for root, dirs, files in walk(self.path):
+            dirs[:] = [d for d in dirs if not ignored(d)]
+            for f in files:
+                if not ignored(f):
+                    try:
+                        st = stat(join(root, f))
+                        snapshot[join(root, f)] = (st.st_mtime_ns, st.st_size)
+                    except FileNotFoundError as e:
+                        pass
+        return snapshot
+
+    def read_events(self):
+        """Paths of the files reported by the pending inotify events"""
+        changed = set()
+        data = read(self.fd, 65536)
+        size = calcsize(event_header)
+        i = 0
+        while i < len(data):
+            wd, event, cookie, length = unpack_from(event_header, data, i)
+            name = data[i + size:i + size + length].rstrip(b"\0").decode()
+            i += size + length
+            if not wd in self.watches or ignored(name):
+                continue
+            path = join(self.watches[wd], name) if name else self.watches[wd]
+            if event & IN_ISDIR and event & (IN_CREATE | IN_MOVED_TO) and isdir(path):
+                for root, dirs, files in walk(path):
+                    dirs[:] = [d for d in dirs if not ignored(d)]
+                    self.add_watch(root)
+                    changed.update(join(root, f) for f in files if not ignored(f))
+            changed.add(path)
+        return changed
+
+    def wait(self, timeout=None):
+        """Wait for changes
+
+        Args:
+            timeout (float): seconds to wait at most, forever if None
+        Returns:
+            (set) paths of the changed files, empty if the timeout expired
+        """
+        if self.fd == None:
+            return self.poll(timeout)
+        changed = set()
+        ready = select([self.fd], [], [], timeout)[0]
+        while ready != []:
+            changed |= self.read_events()
+            ready = select([self.fd], [], [], self.settle)[0]
+        return changed
+
+    def poll(self, timeout=None):
+        """Wait for changes polling the tree, see Watcher.wait"""
+        start = monotonic()
+        while timeout == None or monotonic() - start < timeout:
+            sleep(self.interval)
+            snapshot = self.scan()
+            if snapshot != self.snapshot:
+                sleep(self.settle)
+                snapshot = self.scan()
+                changed = {f for f in set(snapshot) | set(self.snapshot) if snapshot.get(f) != self.snapshot.get(f)}
+                self.snapshot = snapshot
+                return changed
+        return set()
+
+    def close(self):
+        """Stop watching"""
+        if self.fd != None:
+            close(self.fd)
+            self.fd = None
+
+def serve(path, host="localhost", port=8000):
+    """Serve a directory over http in a background thread
+
+    Args:
+        path (str): directory to serve
+        host (str): address to listen on
+        port (int): port to listen on
+    Returns:
+        (ThreadingHTTPServer) the running server
+    """
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        """Serves files without logging every request"""
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), partial(QuietHandler, directory=path))
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server